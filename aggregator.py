@@ -0,0 +1,207 @@
+import logging
+import typing
+import time
+
+from buffers import CandleBuffer, CandleSeries, DEFAULT_CANDLE_WINDOW
+from strategies import TF_EQUIV
+
+if typing.TYPE_CHECKING:
+    from strategies import Strategy
+
+
+logger = logging.getLogger()
+
+
+class CandleAggregator:
+    """
+    Builds the candlesticks of one symbol from the websocket trades, for all the timeframes used by the strategies
+    running on this symbol. Every trade goes through a single pass that updates each timeframe, then the strategies
+    subscribed to a timeframe are notified. Strategies on the same symbol and timeframe share the same CandleBuffer.
+
+    The websocket thread reads the dictionaries below while the interface thread adds/removes strategies, so they
+    are never modified in place: a new dictionary replaces the previous one (copy-on-write).
+    """
+
+    def __init__(self, exchange: str, symbol: str):
+        self.exchange = exchange
+        self.symbol = symbol
+
+        self._candles: typing.Dict[str, CandleBuffer] = dict()
+        self._subscribers: typing.Dict[str, typing.Tuple["Strategy", ...]] = dict()
+
+    def has_timeframe(self, timeframe: str) -> bool:
+        return timeframe in self._candles
+
+    def is_empty(self) -> bool:
+        return len(self._subscribers) == 0
+
+    def load_history(self, timeframe: str, candles: CandleSeries, window: int = DEFAULT_CANDLE_WINDOW):
+        """
+        Start building a timeframe from its historical candles.
+        :param timeframe: One of the TF_EQUIV keys
+        :param candles: Oldest first, the last one being the current (not closed yet) candle
+        :param window: Maximum number of candles kept in memory
+        :return:
+        """
+
+        series = dict(self._candles)
+        series[timeframe] = CandleBuffer.from_series(candles, window)
+        self._candles = series
+
+    def subscribe(self, strategy: "Strategy"):
+        """
+        Give the strategy the candles of its timeframe and notify it of the following trades.
+        The timeframe history must have been loaded before.
+        """
+
+        strategy.set_candles(self._candles[strategy.tf])
+
+        subscribers = dict(self._subscribers)
+        subscribers[strategy.tf] = subscribers.get(strategy.tf, tuple()) + (strategy,)
+        self._subscribers = subscribers
+
+    def unsubscribe(self, strategy: "Strategy"):
+        """
+        Stop notifying the strategy. A timeframe without strategies is not built anymore.
+        """
+
+        subscribers = dict(self._subscribers)
+        remaining = tuple(s for s in subscribers.get(strategy.tf, tuple()) if s is not strategy)
+
+        if len(remaining) > 0:
+            subscribers[strategy.tf] = remaining
+        else:
+            subscribers.pop(strategy.tf, None)
+
+            series = dict(self._candles)
+            series.pop(strategy.tf, None)
+            self._candles = series
+
+        self._subscribers = subscribers
+
+    def on_trade(self, price: float, size: float, timestamp: int):
+        """
+        Parse a new trade coming in from the websocket, update the candles of every timeframe and notify the
+        strategies.
+        :param price: The trade price
+        :param size: The trade size
+        :param timestamp: Unix timestamp in milliseconds
+        :return:
+        """
+
+        timestamp_diff = int(time.time() * 1000) - timestamp
+        if timestamp_diff >= 2000:
+            logger.warning("%s %s: %s milliseconds of difference between the current time and the trade time",
+                           self.exchange, self.symbol, timestamp_diff)
+
+        subscribers = self._subscribers
+
+        for timeframe, candles in self._candles.items():
+            tick_type = self._update_candles(timeframe, candles, price, size, timestamp)
+
+            for strategy in subscribers.get(timeframe, tuple()):
+                strategy.on_candle_update(tick_type)
+
+    def on_trades(self, prices: typing.List[float], sizes: typing.List[float], timestamps: typing.List[int]):
+        """
+        Same as on_trade() for several trades received together (e.g: one Bitmex message).
+        For each timeframe, the trades are split at the candle changes: the first trade of a new candle is processed
+        like in on_trade(), the following trades of the same candle are added to it in one pass and the strategies
+        are notified once with on_trades().
+        :param prices: Trade prices, oldest trade first
+        :param sizes: Trade sizes
+        :param timestamps: Unix timestamps in milliseconds
+        :return:
+        """
+
+        timestamp_diff = int(time.time() * 1000) - timestamps[-1]
+        if timestamp_diff >= 2000:
+            logger.warning("%s %s: %s milliseconds of difference between the current time and the trade time",
+                           self.exchange, self.symbol, timestamp_diff)
+
+        subscribers = self._subscribers
+        n = len(prices)
+
+        for timeframe, candles in self._candles.items():
+            strategies = subscribers.get(timeframe, tuple())
+            candle_end = candles.last_timestamp + TF_EQUIV[timeframe] * 1000
+
+            start = 0
+
+            while start < n:
+                if timestamps[start] >= candle_end:
+                    tick_type = self._update_candles(timeframe, candles, prices[start], sizes[start],
+                                                     timestamps[start])
+                    candle_end = candles.last_timestamp + TF_EQUIV[timeframe] * 1000
+
+                    for strategy in strategies:
+                        strategy.on_candle_update(tick_type)
+
+                    start += 1
+                    continue
+
+                stop = start + 1
+                while stop < n and timestamps[stop] < candle_end:
+                    stop += 1
+
+                if stop - start == 1:
+                    candles.update_last(prices[start], sizes[start])
+
+                    for strategy in strategies:
+                        strategy.on_candle_update("same_candle")
+                else:
+                    segment_prices = prices[start:stop]
+                    segment_sizes = sizes[start:stop]
+
+                    candles.update_last_many(segment_prices, segment_sizes)
+
+                    for strategy in strategies:
+                        strategy.on_trades(segment_prices, segment_sizes)
+
+                start = stop
+
+    def _update_candles(self, timeframe: str, candles: CandleBuffer, price: float, size: float,
+                        timestamp: int) -> str:
+        """
+        Update the candles of one timeframe based on the trade timestamp.
+        :return: same_candle or new_candle
+        """
+
+        tf_equiv = TF_EQUIV[timeframe] * 1000
+        last_timestamp = candles.last_timestamp
+
+        # Same Candle
+
+        if timestamp < last_timestamp + tf_equiv:
+
+            candles.update_last(price, size)
+
+            return "same_candle"
+
+        # Missing Candle(s)
+
+        elif timestamp >= last_timestamp + 2 * tf_equiv:
+
+            missing_candles = int((timestamp - last_timestamp) / tf_equiv) - 1
+
+            logger.info("%s missing %s candles for %s %s (%s %s)", self.exchange, missing_candles, self.symbol,
+                        timeframe, timestamp, last_timestamp)
+
+            last_close = candles.last_close
+
+            for missing in range(missing_candles):
+                last_timestamp += tf_equiv
+                candles.append(last_timestamp, last_close, last_close, last_close, last_close, 0)
+
+            candles.append(last_timestamp + tf_equiv, price, price, price, price, size)
+
+            return "new_candle"
+
+        # New Candle
+
+        else:
+            candles.append(last_timestamp + tf_equiv, price, price, price, price, size)
+
+            logger.info("%s New candle for %s %s", self.exchange, self.symbol, timeframe)
+
+            return "new_candle"
@@ -0,0 +1,225 @@
+import logging
+import typing
+
+import numpy as np
+import pandas as pd
+
+from buffers import CandleSeries
+
+
+logger = logging.getLogger()
+
+
+class BacktestResult:
+    def __init__(self, trades: typing.List[typing.Dict], equity: np.ndarray, exposure: float):
+        """
+        :param trades: One dictionary per trade (entry/exit time and price, side, pnl in %, exit reason)
+        :param equity: Cumulated PNL in % after each trade
+        :param exposure: Fraction of the candles during which a position was open
+        """
+
+        self.trades = trades
+        self.equity = equity
+        self.exposure = exposure
+
+        self.pnl: float = float(equity[-1]) if len(equity) > 0 else 0.0
+
+        # Largest drop of the cumulated PNL from a previous peak, the starting point (0 %) included
+        peaks = np.maximum.accumulate(np.concatenate(([0.0], equity)))
+        self.max_drawdown: float = float(np.max(peaks[1:] - equity)) if len(equity) > 0 else 0.0
+
+        if len(trades) > 0:
+            self.win_rate: float = sum(1 for t in trades if t['pnl'] > 0) / len(trades)
+        else:
+            self.win_rate = 0.0
+
+
+def technical_signals(close: np.ndarray, ema_fast: int, ema_slow: int, ema_signal: int,
+                      rsi_length: int) -> np.ndarray:
+    """
+    Same rules as TechnicalStrategy._check_signal(), computed for every candle at once.
+    :return: 1 (Long), -1 (Short) or 0 for each candle, based on the indicators at the close of the candle
+    """
+
+    closes = pd.Series(close)
+
+    macd_line = closes.ewm(span=ema_fast).mean() - closes.ewm(span=ema_slow).mean()
+    macd_signal = macd_line.ewm(span=ema_signal).mean()
+
+    delta = closes.diff()
+    avg_gain = delta.clip(lower=0).ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+    avg_loss = (-delta).clip(lower=0).ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+
+    rsi = (100 - 100 / (1 + avg_gain / avg_loss)).round(2).to_numpy()
+    macd_line = macd_line.to_numpy()
+    macd_signal = macd_signal.to_numpy()
+
+    signals = np.zeros(len(close), dtype=np.int8)
+    signals[(rsi < 30) & (macd_line > macd_signal)] = 1
+    signals[(rsi > 70) & (macd_line < macd_signal)] = -1
+
+    return signals
+
+
+def breakout_signals(high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray,
+                     min_volume: float) -> np.ndarray:
+    """
+    Same rules as BreakoutStrategy._check_signal(), evaluated on closed candles.
+    Live, the signal can be triggered in the middle of the candle, at bar level the close is the best approximation.
+    :return: 1 (Long), -1 (Short) or 0 for each candle
+    """
+
+    signals = np.zeros(len(close), dtype=np.int8)
+
+    if len(close) < 2:
+        return signals
+
+    enough_volume = volume[1:] > min_volume
+    signals[1:][(close[1:] > high[:-1]) & enough_volume] = 1
+    signals[1:][(close[1:] < low[:-1]) & enough_volume] = -1
+
+    return signals
+
+
+def _find_exit(candles: CandleSeries, entry_bar: int, side: int, tp_price: typing.Optional[float],
+               sl_price: typing.Optional[float]) -> typing.Tuple[int, float, str]:
+    """
+    Find the first candle where the Take profit or Stop loss price is reached, same thresholds as
+    Strategy._arm_tp_sl(). The candles are scanned by chunks of increasing size so that short trades
+    don't compare the whole remaining history.
+    If both are reached during the same candle, the Stop loss is assumed to come first.
+    :return: Exit candle index, exit price, exit reason
+    """
+
+    n = len(candles.close)
+    start = entry_bar
+    chunk = 64
+
+    while start < n:
+        stop = min(n, start + chunk)
+
+        if side == 1:
+            sl_hit = candles.low[start:stop] <= sl_price if sl_price is not None else None
+            tp_hit = candles.high[start:stop] >= tp_price if tp_price is not None else None
+        else:
+            sl_hit = candles.high[start:stop] >= sl_price if sl_price is not None else None
+            tp_hit = candles.low[start:stop] <= tp_price if tp_price is not None else None
+
+        if sl_hit is None and tp_hit is None:
+            break
+        elif sl_hit is None:
+            hit = tp_hit
+        elif tp_hit is None:
+            hit = sl_hit
+        else:
+            hit = sl_hit | tp_hit
+
+        if hit.any():
+            idx = int(hit.argmax())
+            bar = start + idx
+
+            if sl_hit is not None and sl_hit[idx]:
+                price, reason = sl_price, "stop_loss"
+            else:
+                price, reason = tp_price, "take_profit"
+
+            # A gap at the open of a later candle fills at the open price, not at the threshold
+            if bar > entry_bar:
+                open_price = candles.open[bar]
+                if (reason == "stop_loss") == (side == 1):
+                    price = min(price, open_price)
+                else:
+                    price = max(price, open_price)
+
+            return bar, float(price), reason
+
+        start = stop
+        chunk *= 2
+
+    return n - 1, float(candles.close[-1]), "end"
+
+
+def simulate(candles: CandleSeries, signals: np.ndarray, take_profit: typing.Optional[float],
+             stop_loss: typing.Optional[float], allow_short: bool = True) -> BacktestResult:
+    """
+    Turn candle signals into trades. Like the live strategies, only one position can be open at a time:
+    a signal on a candle opens a position at the open of the next candle, which is then closed by the Take profit
+    or the Stop loss (in %).
+    The candles are processed with NumPy, the Python loop only runs once per trade.
+    :param candles:
+    :param signals: 1 (Long), -1 (Short) or 0 for each candle
+    :param take_profit: In %, None to disable it
+    :param stop_loss: In %, None to disable it
+    :param allow_short: False for Binance Spot, where Short signals are ignored
+    :return:
+    """
+
+    n = len(candles.close)
+
+    if allow_short:
+        entry_bars = np.flatnonzero(signals[:-1]) + 1
+    else:
+        entry_bars = np.flatnonzero(signals[:-1] == 1) + 1
+
+    trades = []
+    bars_in_position = 0
+    next_allowed = 0
+
+    while True:
+        k = int(np.searchsorted(entry_bars, next_allowed))
+        if k >= len(entry_bars):
+            break
+
+        entry_bar = int(entry_bars[k])
+        side = int(signals[entry_bar - 1])
+        entry_price = float(candles.open[entry_bar])
+
+        if side == 1:
+            tp_price = entry_price * (1 + take_profit / 100) if take_profit is not None else None
+            sl_price = entry_price * (1 - stop_loss / 100) if stop_loss is not None else None
+        else:
+            tp_price = entry_price * (1 - take_profit / 100) if take_profit is not None else None
+            sl_price = entry_price * (1 + stop_loss / 100) if stop_loss is not None else None
+
+        exit_bar, exit_price, reason = _find_exit(candles, entry_bar, side, tp_price, sl_price)
+
+        trades.append({"entry_time": int(candles.timestamp[entry_bar]), "exit_time": int(candles.timestamp[exit_bar]),
+                       "side": "long" if side == 1 else "short", "entry_price": entry_price,
+                       "exit_price": exit_price, "pnl": side * (exit_price - entry_price) / entry_price * 100,
+                       "exit_reason": reason})
+
+        bars_in_position += exit_bar - entry_bar + 1
+
+        # The strategy looks for a new signal once the position is closed
+        next_allowed = exit_bar + 1
+
+    equity = np.cumsum([t['pnl'] for t in trades], dtype=np.float64)
+    exposure = bars_in_position / n if n > 0 else 0.0
+
+    return BacktestResult(trades, equity, exposure)
+
+
+def run_backtest(strategy_type: str, candles: CandleSeries, take_profit: typing.Optional[float],
+                 stop_loss: typing.Optional[float], extra_params: typing.Dict,
+                 allow_short: bool = True) -> BacktestResult:
+    """
+    Evaluate a strategy on historical candles.
+    :param strategy_type: Technical or Breakout, like in the strategy component
+    :param candles: Oldest first
+    :param take_profit: In %
+    :param stop_loss: In %
+    :param extra_params: Same parameters as the strategy 'extra_params' (e.g: ema_fast, min_volume...)
+    :param allow_short: False for Binance Spot
+    :return:
+    """
+
+    if strategy_type == "Technical":
+        signals = technical_signals(candles.close, extra_params['ema_fast'], extra_params['ema_slow'],
+                                    extra_params['ema_signal'], extra_params['rsi_length'])
+    elif strategy_type == "Breakout":
+        signals = breakout_signals(candles.high, candles.low, candles.close, candles.volume,
+                                   extra_params['min_volume'])
+    else:
+        raise ValueError(f"Unknown strategy type: {strategy_type}")
+
+    return simulate(candles, signals, take_profit, stop_loss, allow_short)
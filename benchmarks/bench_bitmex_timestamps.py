@@ -0,0 +1,66 @@
+"""
+Conversion of Bitmex timestamps (2021-06-06T12:34:56.789Z) to Unix timestamps in milliseconds, with
+dateutil.parser.isoparse() as the connector used to do and with models.bitmex_timestamp_to_ms().
+The results of both are compared first.
+
+Usage: python benchmarks/bench_bitmex_timestamps.py [number of timestamps]
+"""
+
+import os
+import sys
+import time
+import random
+import datetime
+
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import bitmex_timestamp_to_ms
+
+
+def make_timestamps(n: int):
+    """
+    Timestamps of consecutive trades over a few days, like the live trades or a long history.
+    """
+
+    start = datetime.datetime(2021, 6, 6, 23, 0, tzinfo=datetime.timezone.utc).timestamp() * 1000
+    timestamps = []
+
+    ts = start
+    for _ in range(n):
+        ts += random.randint(0, 2000)
+        timestamps.append(datetime.datetime.utcfromtimestamp(ts / 1000).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z")
+
+    return timestamps
+
+
+def with_dateutil(timestamp: str) -> int:
+    return int(round(dateutil.parser.isoparse(timestamp).timestamp() * 1000))
+
+
+def measure(convert, timestamps) -> float:
+    start = time.perf_counter()
+
+    for timestamp in timestamps:
+        convert(timestamp)
+
+    return (time.perf_counter() - start) / len(timestamps) * 1e9
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+    random.seed(1)
+    timestamps = make_timestamps(n)
+
+    mismatches = [t for t in timestamps if with_dateutil(t) != bitmex_timestamp_to_ms(t)]
+    if len(mismatches) > 0:
+        raise SystemExit(f"{len(mismatches)} different results, e.g: {mismatches[0]}")
+
+    dateutil_ns = measure(with_dateutil, timestamps)
+    fast_ns = measure(bitmex_timestamp_to_ms, timestamps)
+
+    print(f"{n} timestamps from {timestamps[0]} to {timestamps[-1]} (nanoseconds per timestamp)")
+    print(f"dateutil.parser.isoparse: {dateutil_ns:,.0f}")
+    print(f"  bitmex_timestamp_to_ms: {fast_ns:,.0f} ({dateutil_ns / fast_ns:.1f}x faster)")
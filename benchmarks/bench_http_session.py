@@ -0,0 +1,97 @@
+"""
+Latency of REST requests with a new connection per request (module-level requests.get, as the connectors used to do)
+and with the pooled keep-alive session of the connectors, against a local HTTPS server.
+Requires the openssl command line tool to create a self-signed certificate.
+
+Usage: python benchmarks/bench_http_session.py [number of requests]
+"""
+
+import os
+import sys
+import ssl
+import time
+import json
+import tempfile
+import threading
+import subprocess
+import statistics
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+import urllib3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connectors.http_session import create_session, REQUEST_TIMEOUT
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+    disable_nagle_algorithm = True  # Headers and body are written separately, avoids delayed ACK stalls
+
+    def do_GET(self):
+        body = json.dumps({"symbol": "BTCUSDT", "bidPrice": "35000.10", "askPrice": "35000.20"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(cert_dir: str) -> ThreadingHTTPServer:
+    cert = os.path.join(cert_dir, "cert.pem")
+    key = os.path.join(cert_dir, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key, "-out", cert,
+                    "-days", "1", "-subj", "/CN=localhost"], check=True, capture_output=True)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def measure(get, url: str, n: int):
+    latencies = []
+
+    for _ in range(n):
+        start = time.perf_counter()
+        response = get(url)
+        response.json()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+
+    return statistics.mean(latencies), latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_server(tmp)
+        url = f"https://127.0.0.1:{server.server_address[1]}/api/v3/ticker/bookTicker"
+
+        session = create_session()
+
+        results = {
+            "new connection per request": measure(lambda u: requests.get(u, verify=False), url, n),
+            "pooled keep-alive session": measure(lambda u: session.get(u, verify=False, timeout=REQUEST_TIMEOUT),
+                                                 url, n),
+        }
+
+        server.shutdown()
+
+    print(f"{n} requests to a local HTTPS server (milliseconds)")
+    for name, (mean, p50, p99) in results.items():
+        print(f"{name:>28}: mean {mean:.3f}  p50 {p50:.3f}  p99 {p99:.3f}")
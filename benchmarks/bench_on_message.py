@@ -0,0 +1,176 @@
+"""
+Websocket messages processed per second by each connector, from _on_message() until the market data workers have
+processed them, with the json module and with orjson (if installed) as decoder. The messages mix the symbol traded by
+a strategy with symbols without strategy, like a busy stream would. No network connection is made.
+The "before" line is the baseline without the changes of the decoding: every message is decoded by the json module and
+the updates of the symbols without strategy go to the workers like the others.
+
+Usage: python benchmarks/bench_on_message.py [number of messages]
+"""
+
+import os
+import sys
+import logging
+import time
+import json
+import random
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Candle
+from buffers import CandleSeries
+from aggregator import CandleAggregator
+from connectors.binance import BinanceClient
+from connectors.bitmex import BitmexClient
+from connectors.decoding import get_decoder, orjson
+from connectors.dispatcher import SymbolDispatcher
+from connectors.price_board import PriceBoard
+
+OTHER_SYMBOLS = 20  # Symbols subscribed to without strategy
+TRADED_SHARE = 0.2  # Share of the trades of the symbol traded by a strategy
+
+
+def make_aggregator(exchange: str, symbol: str) -> CandleAggregator:
+    now = int(time.time() * 1000) // 60000 * 60000
+
+    aggregator = CandleAggregator(exchange, symbol)
+    aggregator.load_history("1m", CandleSeries.from_candles(
+        [Candle({'ts': now - i * 60000, 'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0, 'volume': 1.0},
+                "1m", "parse_trade") for i in reversed(range(1000))]))
+
+    return aggregator
+
+
+def binance_messages(n: int):
+    now = int(time.time() * 1000)
+    symbols = [f"SYM{i}USDT" for i in range(OTHER_SYMBOLS)]
+    messages = []
+
+    for i in range(n):
+        symbol = "BTCUSDT" if random.random() < TRADED_SHARE else random.choice(symbols)
+        price = 35000 + random.random() * 10
+
+        if i % 2 == 0:
+            data = {"e": "aggTrade", "E": now, "s": symbol, "a": i, "p": f"{price:.2f}", "q": "0.015", "f": i,
+                    "l": i, "T": now, "m": True}
+            stream = symbol.lower() + "@aggTrade"
+        else:
+            data = {"e": "bookTicker", "u": i, "s": symbol, "b": f"{price:.2f}", "B": "1.5", "a": f"{price + 0.1:.2f}",
+                    "A": "2.1", "T": now, "E": now}
+            stream = symbol.lower() + "@bookTicker"
+
+        # Combined stream format
+        messages.append(json.dumps({"stream": stream, "data": data}, separators=(",", ":")))
+
+    return messages
+
+
+def bitmex_messages(n: int):
+    now = datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+    symbols = [f"SYM{i}USD" for i in range(OTHER_SYMBOLS)]
+    messages = []
+
+    for i in range(n):
+        symbol = "XBTUSD" if random.random() < TRADED_SHARE else random.choice(symbols)
+        price = 35000 + random.random() * 10
+
+        if i % 2 == 0:
+            messages.append(json.dumps({"table": "trade", "action": "insert", "data": [
+                {"timestamp": now, "symbol": symbol, "side": "Buy", "size": 100, "price": price,
+                 "tickDirection": "PlusTick", "trdMatchID": "00000000-006d-1000-0000-000000000000",
+                 "grossValue": 285700, "homeNotional": 0.002857, "foreignNotional": 100}]}, separators=(",", ":")))
+        else:
+            messages.append(json.dumps({"table": "instrument", "action": "update", "data": [
+                {"symbol": symbol, "bidPrice": price, "askPrice": price + 0.5, "timestamp": now}]},
+                separators=(",", ":")))
+
+    return messages
+
+
+class UnfilteredBinanceClient(BinanceClient):
+    def _on_message(self, ws, msg: str):
+        """
+        BinanceClient._on_message() without skipping the trades of the symbols without strategy before decoding.
+        """
+
+        data = self._decode(msg)
+
+        if "data" not in data:
+            return
+
+        data = data['data']
+
+        if "u" in data and "A" in data:
+            data['e'] = "bookTicker"
+
+        if "e" in data and "s" in data:
+            self._dispatcher.submit(data['s'], data)
+
+
+class UnfilteredBitmexClient(BitmexClient):
+    def _on_message(self, ws, msg: str):
+        """
+        BitmexClient._on_message() without skipping the trades of the symbols without strategy, for the market data
+        tables only.
+        """
+
+        data = self._decode(msg)
+
+        if data.get('table') in ["instrument", "trade"]:
+            for d in data['data']:
+                self._dispatcher.submit(d['symbol'], (data['table'], d))
+
+
+def binance_client(cls: type = BinanceClient) -> BinanceClient:
+    client = cls.__new__(cls)
+    client.prices = PriceBoard()
+    client.symbol_strategies = dict()
+    client.aggregators = {"BTCUSDT": make_aggregator("binance_futures", "BTCUSDT")}
+    client._last_agg_trade_ids = dict()
+    client._dispatcher = SymbolDispatcher("Binance", client._process_market_data)
+    return client
+
+
+def bitmex_client(cls: type = BitmexClient) -> BitmexClient:
+    client = cls.__new__(cls)
+    client.prices = PriceBoard()
+    client.symbol_strategies = dict()
+    client.aggregators = {"XBTUSD": make_aggregator("bitmex", "XBTUSD")}
+    client._dispatcher = SymbolDispatcher("Bitmex", client._process_market_data)
+    return client
+
+
+def measure(client, messages) -> float:
+    start = time.perf_counter()
+
+    for msg in messages:
+        client._on_message(None, msg)
+
+    client._dispatcher.join()
+
+    return len(messages) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+    random.seed(1)
+
+    # The trade timestamps get older than the time drift warning of the aggregator during the run
+    logging.disable(logging.WARNING)
+
+    # (label, decoder, skip the symbols without strategy early)
+    modes = [("before", "json", False), ("json", "json", True)]
+    if orjson is not None:
+        modes.append(("orjson", "orjson", True))
+
+    print(f"{n} messages, {TRADED_SHARE:.0%} of them for the symbol traded by a strategy (messages/second)")
+
+    for name, make_client, unfiltered_cls, messages in [
+            ("Binance", binance_client, UnfilteredBinanceClient, binance_messages(n)),
+            ("Bitmex", bitmex_client, UnfilteredBitmexClient, bitmex_messages(n))]:
+        for label, decoder, prefilter in modes:
+            client = make_client() if prefilter else make_client(unfiltered_cls)
+            client._decode = get_decoder(decoder)
+            print(f"{name:>8} {label:>7}: {measure(client, messages):,.0f}")
@@ -0,0 +1,130 @@
+"""
+Duration of one refresh of the interface against the number of trade rows, with the full walk Root._update_ui used to
+do (every trade of every strategy, every variable set) and with Root._refresh() (only the trades queued in
+changed_trades, variables set only when their text has changed). A share of the trades get a new PNL before each
+refresh, like the bid/ask updates do between two refreshes. The time Tk takes to redraw the labels is included.
+
+Needs a display for Tkinter, exits without measuring otherwise.
+
+Usage: python benchmarks/bench_ui_tick.py [share of the trades changed before each refresh]
+"""
+
+import os
+import sys
+import time
+import types
+import random
+import tempfile
+import collections
+import tkinter as tk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Trade
+from buffers import LogBuffer
+from strategies import Strategy
+from connectors.price_board import PriceBoard
+from interface.root_component import Root
+from interface.logging_component import Logging
+from interface.trades_component import TradesWatch
+
+ROW_COUNTS = [50, 200, 1000]
+REFRESHES = 20
+
+
+def make_client(trades: int):
+    contract = types.SimpleNamespace(symbol="BTCUSDT", exchange="binance_futures", price_decimals=2)
+
+    strategy = types.SimpleNamespace(logs=LogBuffer(), trades=[], changed_trades=collections.deque())
+
+    for i in range(trades):
+        trade = Trade({"time": i, "contract": contract, "strategy": "Technical", "side": "long",
+                       "entry_price": 35000.0, "status": "open", "pnl": 0.0, "quantity": 0.01, "entry_id": i})
+        strategy.trades.append(trade)
+        Strategy.trade_changed(strategy, trade)
+
+    return types.SimpleNamespace(logs=LogBuffer(), strategies={0: strategy}, prices=PriceBoard())
+
+
+def make_root(trades: int) -> Root:
+    """
+    Only the components used by the refresh, the Watchlist is left empty.
+    """
+
+    root = Root.__new__(Root)
+    tk.Tk.__init__(root)
+
+    root.binance = make_client(trades)
+    root.bitmex = make_client(0)
+    root.logging_frame = Logging(root)
+    root._trades_frame = TradesWatch(root)
+    root._trades_frame.pack()
+    root._watchlist_frame = types.SimpleNamespace(body_widgets={'symbol': dict()})
+    root._watchlist_versions = dict()
+    root._log_cursors = dict()
+    root.bitmex.set_watchlist = lambda symbols: None
+
+    return root
+
+
+def full_refresh(root: Root):
+    for client in [root.binance, root.bitmex]:
+        for b_index, strat in client.strategies.items():
+            for trade in strat.trades:
+                if trade.time not in root._trades_frame.body_widgets['symbol']:
+                    root._trades_frame.add_trade(trade)
+
+                pnl_str = "{0:.{prec}f}".format(trade.pnl, prec=trade.contract.price_decimals)
+                root._trades_frame.body_widgets['pnl_var'][trade.time].set(pnl_str)
+                root._trades_frame.body_widgets['status_var'][trade.time].set(trade.status.capitalize())
+                root._trades_frame.body_widgets['quantity_var'][trade.time].set(trade.quantity)
+
+
+def measure(root: Root, refresh, share: float) -> float:
+    strategy = root.binance.strategies[0]
+
+    # The first refresh creates the rows
+    refresh(root)
+    root.update_idletasks()
+
+    total = 0.0
+
+    for _ in range(REFRESHES):
+        for trade in random.sample(strategy.trades, int(len(strategy.trades) * share)):
+            trade.pnl = random.uniform(-10, 10)
+            Strategy.trade_changed(strategy, trade)
+
+        start = time.perf_counter()
+        refresh(root)
+        root.update_idletasks()
+        total += time.perf_counter() - start
+
+    return total / REFRESHES * 1000
+
+
+if __name__ == "__main__":
+    share = float(sys.argv[1]) if len(sys.argv) > 1 else 0.05
+
+    try:
+        tk.Tk().destroy()
+    except tk.TclError as e:
+        raise SystemExit(f"Tkinter can't open a window, nothing measured: {e}")
+
+    random.seed(1)
+
+    # The trade journal of the Trades component is created in the working directory
+    os.chdir(tempfile.mkdtemp())
+
+    print(f"{share:.0%} of the trades changed before each refresh (milliseconds per refresh)")
+    print(f"{'rows':>6} {'full':>8} {'tracked':>8}")
+
+    for rows in ROW_COUNTS:
+        results = []
+
+        for refresh in [full_refresh, Root._refresh]:
+            root = make_root(rows)
+            root.withdraw()
+            results.append(measure(root, refresh, share))
+            root.destroy()
+
+        print(f"{rows:>6} {results[0]:>8.2f} {results[1]:>8.2f}")
@@ -0,0 +1,240 @@
+import typing
+import threading
+
+import numpy as np
+
+from models import Candle
+
+
+DEFAULT_CANDLE_WINDOW = 1000  # Number of candles kept in memory by a strategy (Binance sends 1000 historical candles)
+DEFAULT_LOG_CAPACITY = 500  # Number of log messages kept in memory by a client or a strategy
+
+
+class CandleSeries(typing.NamedTuple):
+    """
+    Columnar candlestick data, oldest first. Each field is a NumPy array of the same length.
+    """
+
+    timestamp: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    @classmethod
+    def from_candles(cls, candles: typing.List[Candle]) -> "CandleSeries":
+        """
+        Convert the Candle objects built by the connectors from a page of historical data.
+        """
+
+        return cls(np.array([c.timestamp for c in candles], dtype=np.int64),
+                   np.array([c.open for c in candles], dtype=np.float64),
+                   np.array([c.high for c in candles], dtype=np.float64),
+                   np.array([c.low for c in candles], dtype=np.float64),
+                   np.array([c.close for c in candles], dtype=np.float64),
+                   np.array([c.volume for c in candles], dtype=np.float64))
+
+    @classmethod
+    def concatenate(cls, parts: typing.List["CandleSeries"]) -> "CandleSeries":
+        """
+        Join series into one sorted by timestamp, e.g: pages of historical data fetched in any order.
+        Candles present in several parts (overlapping pages) are only kept once.
+        """
+
+        if len(parts) == 0:
+            return cls.from_candles([])
+
+        columns = [np.concatenate([getattr(part, field) for part in parts]) for field in cls._fields]
+        _, first_index = np.unique(columns[0], return_index=True)  # Sorted unique timestamps
+
+        return cls(*[column[first_index] for column in columns])
+
+
+class CandleBuffer:
+    """
+    Fixed capacity store of the most recent candlesticks, in columns.
+    When the buffer is full, appending a candle drops the oldest one.
+
+    Every value is written twice, at position i and i + capacity of arrays twice as long as the capacity,
+    so the current window is always a contiguous slice: the timestamp/open/high/low/close/volume properties are
+    views on the buffer (no copy). A view is only valid until the next append().
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CANDLE_WINDOW):
+        if capacity < 1:
+            raise ValueError("The candle buffer capacity must be at least 1")
+
+        self.capacity = capacity
+
+        self._timestamp = np.zeros(2 * capacity, dtype=np.int64)
+        self._open = np.zeros(2 * capacity, dtype=np.float64)
+        self._high = np.zeros(2 * capacity, dtype=np.float64)
+        self._low = np.zeros(2 * capacity, dtype=np.float64)
+        self._close = np.zeros(2 * capacity, dtype=np.float64)
+        self._volume = np.zeros(2 * capacity, dtype=np.float64)
+
+        self._start = 0  # Position of the oldest candle, between 0 and capacity - 1
+        self._size = 0
+
+    @classmethod
+    def from_series(cls, candles: CandleSeries, capacity: int = DEFAULT_CANDLE_WINDOW) -> "CandleBuffer":
+        buffer = cls(capacity)
+
+        for row in zip(*[column[-capacity:].tolist() for column in candles]):
+            buffer.append(*row)
+
+        return buffer
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _last_position(self) -> int:
+        return (self._start + self._size - 1) % self.capacity
+
+    def append(self, timestamp: int, open_price: float, high: float, low: float, close: float, volume: float):
+        """
+        Add a new candle at the end of the buffer, in O(1).
+        """
+
+        if self._size == self.capacity:
+            self._start = (self._start + 1) % self.capacity
+        else:
+            self._size += 1
+
+        pos = self._last_position()
+
+        for p in (pos, pos + self.capacity):
+            self._timestamp[p] = timestamp
+            self._open[p] = open_price
+            self._high[p] = high
+            self._low[p] = low
+            self._close[p] = close
+            self._volume[p] = volume
+
+    def update_last(self, price: float, size: float):
+        """
+        Add a trade to the last candle, in O(1).
+        :param price: The trade price, which becomes the candle close
+        :param size: The trade size, added to the candle volume
+        :return:
+        """
+
+        pos = self._last_position()
+
+        high = self._high[pos]
+        low = self._low[pos]
+        volume = self._volume[pos] + size
+
+        if price > high:
+            high = price
+        elif price < low:
+            low = price
+
+        for p in (pos, pos + self.capacity):
+            self._close[p] = price
+            self._high[p] = high
+            self._low[p] = low
+            self._volume[p] = volume
+
+    def update_last_many(self, prices: typing.List[float], sizes: typing.List[float]):
+        """
+        Add several trades to the last candle at once.
+        :param prices: Trade prices, in the order of the trades
+        :param sizes: Trade sizes
+        :return:
+        """
+
+        pos = self._last_position()
+
+        high = max(self._high[pos], max(prices))
+        low = min(self._low[pos], min(prices))
+        volume = self._volume[pos] + sum(sizes)
+
+        for p in (pos, pos + self.capacity):
+            self._close[p] = prices[-1]
+            self._high[p] = high
+            self._low[p] = low
+            self._volume[p] = volume
+
+    @property
+    def last_timestamp(self) -> int:
+        return int(self._timestamp[self._last_position()])
+
+    @property
+    def last_close(self) -> float:
+        return float(self._close[self._last_position()])
+
+    @property
+    def timestamp(self) -> np.ndarray:
+        return self._timestamp[self._start:self._start + self._size]
+
+    @property
+    def open(self) -> np.ndarray:
+        return self._open[self._start:self._start + self._size]
+
+    @property
+    def high(self) -> np.ndarray:
+        return self._high[self._start:self._start + self._size]
+
+    @property
+    def low(self) -> np.ndarray:
+        return self._low[self._start:self._start + self._size]
+
+    @property
+    def close(self) -> np.ndarray:
+        return self._close[self._start:self._start + self._size]
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self._volume[self._start:self._start + self._size]
+
+
+class LogBuffer:
+    """
+    Fixed capacity store of the most recent log messages. When the buffer is full, a new message replaces the oldest.
+
+    Messages are numbered in the order they are added. Each reader keeps its own cursor, the number of the next
+    message it hasn't read, and read() returns the messages added since, so nothing is marked in the buffer and
+    several readers can follow it. Messages overwritten before a reader got to them are skipped.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_LOG_CAPACITY):
+        if capacity < 1:
+            raise ValueError("The log buffer capacity must be at least 1")
+
+        self.capacity = capacity
+
+        self._messages: typing.List[typing.Optional[str]] = [None] * capacity
+        self._next = 0  # Number of the next message added, i.e: number of messages added so far
+        self._lock = threading.Lock()  # Messages are added from the websocket, execution and interface threads
+
+    def __len__(self) -> int:
+        return min(self._next, self.capacity)
+
+    def append(self, message: str):
+        with self._lock:
+            # The message is stored before being counted, so readers never see a slot that isn't written yet
+            self._messages[self._next % self.capacity] = message
+            self._next += 1
+
+    def read(self, cursor: int = 0) -> typing.Tuple[typing.List[str], int]:
+        """
+        Doesn't take the lock, the writers don't wait for the interface.
+        :param cursor: Number of the first message to return, 0 for all the messages still in the buffer
+        :return: The messages from the cursor on (oldest first), and the cursor to give to the next call
+        """
+
+        end = self._next
+        start = max(cursor, end - self.capacity)
+
+        messages = [self._messages[i % self.capacity] for i in range(start, end)]
+
+        # A message being added meanwhile may have overwritten the first slots that were read (the slot of message
+        # n is reused by message n + capacity, which is stored before self._next is incremented, so even if
+        # self._next hasn't changed the oldest slot may already hold the next message)
+        overwritten = self._next - self.capacity - start + 1
+        if overwritten > 0:
+            messages = messages[overwritten:]
+
+        return messages, end
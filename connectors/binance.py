@@ -1,5 +1,4 @@
 import logging
-import requests
 import time
 import typing
 import collections
@@ -10,17 +9,46 @@ import hmac
 import hashlib
 
 import websocket
-import json
 
 import threading
 
+from concurrent.futures import ThreadPoolExecutor
+
 from models import *
 
-from strategies import TechnicalStrategy, BreakoutStrategy
+from strategies import TechnicalStrategy, BreakoutStrategy, TF_EQUIV
+from buffers import CandleSeries, LogBuffer, DEFAULT_CANDLE_WINDOW
+from database import CandleCache, TradeJournal, OrderJournal
+from aggregator import CandleAggregator
+from connectors.http_session import create_session, REQUEST_TIMEOUT
+from connectors.order_tracker import OrderTracker
+from connectors.decoding import get_decoder
+from connectors.execution import ExecutionQueue
+from connectors.dispatcher import SymbolDispatcher
+from connectors.price_board import PriceBoard, PriceSnapshot
+from connectors.binance_streams import CombinedStreams
+from connectors.rate_limiter import RateBudget, RequestScheduler, PRIORITY_ORDER, PRIORITY_ACCOUNT, \
+    PRIORITY_MARKET, PRIORITY_HISTORY
 
 
 logger = logging.getLogger()
 
+HISTORY_WORKERS = 8  # Pages of historical candles requested at the same time
+
+# Estimated weight of the endpoints (1 if not listed), corrected by the X-MBX-USED-WEIGHT-1M header of the responses
+ENDPOINT_WEIGHTS = {
+    "/api/v3/exchangeInfo": 20,
+    "/api/v3/klines": 2,
+    "/api/v3/ticker/bookTicker": 2,
+    "/api/v3/account": 20,
+    "/api/v3/myTrades": 20,
+    "/api/v3/openOrders": 6,
+    "/api/v3/userDataStream": 2,
+    "/fapi/v1/klines": 10,
+    "/fapi/v1/ticker/bookTicker": 2,
+    "/fapi/v1/account": 5,
+}
+
 
 class BinanceClient:
     def __init__(self, public_key: str, secret_key: str, testnet: bool, futures: bool):
@@ -56,35 +84,88 @@ class BinanceClient:
 
         self._headers = {'X-MBX-APIKEY': self._public_key}
 
+        # Keeps the connections to the REST API open between requests
+        self._session = create_session()
+
+        self._candle_cache = CandleCache()
+
+        # Closed trades of the strategies
+        self.trade_journal = TradeJournal()
+
+        # Order events of the strategies, replayed when a strategy is started to restore its open trades
+        self.order_journal = OrderJournal()
+
+        # Default limits, replaced by the ones of the exchangeInfo response in get_contracts()
+        if self.futures:
+            budgets = {"weight": RateBudget(2400, 60), "orders": RateBudget(300, 10)}
+        else:
+            budgets = {"weight": RateBudget(1200, 60), "orders": RateBudget(50, 10)}
+
+        self._scheduler = RequestScheduler(budgets)
+
         self.contracts = self.get_contracts()
         self.balances = self.get_balances()
 
-        self.prices = dict()
+        # Latest bid/ask of each symbol, read by the interface thread without lock
+        self.prices = PriceBoard()
+
+        # Replaced by a new dictionary when a strategy is added/removed, like symbol_strategies below
         self.strategies: typing.Dict[int,
                                      typing.Union[TechnicalStrategy, BreakoutStrategy]] = dict()
 
-        self.logs = []
+        # One candle builder per symbol, shared by all the strategies running on this symbol
+        self.aggregators: typing.Dict[str, CandleAggregator] = dict()
+
+        # Strategies running on each symbol, used to dispatch the websocket updates.
+        # Replaced by a new dictionary when a strategy is added/removed, so the websocket thread can loop through it.
+        self.symbol_strategies: typing.Dict[str, typing.Tuple[typing.Union[TechnicalStrategy,
+                                                                           BreakoutStrategy], ...]] = dict()
 
-        self._ws_id = 1
-        self.ws: websocket.WebSocketApp
+        self.logs = LogBuffer()
+
+        self._decode = get_decoder()
         self.reconnect = True
-        self.ws_connected = False
-        self.ws_subscriptions = {"bookTicker": [], "aggTrade": []}
+        self.ws_subscriptions = {"bookTicker": set(), "aggTrade": set()}
+
+        # Last aggregated trade id of each symbol, a trade can be received twice while its stream moves to another
+        # connection
+        self._last_agg_trade_ids: typing.Dict[str, int] = dict()
+
+        # Candles, PNL and strategies are updated by several threads, each symbol always by the same one
+        self._dispatcher = SymbolDispatcher(self.platform, self._process_market_data)
+
+        # Market data, on as many connections to the combined stream endpoint as needed. /ws -> /stream
+        self._streams = CombinedStreams(self._wss_url[:-len("/ws")] + "/stream", self._on_message)
 
-        t = threading.Thread(target=self._start_ws)
+        # Order updates of the account, received from the user data stream
+        self.order_tracker = OrderTracker(self)
+
+        # Orders of the strategies, sent from a separate thread so that the websocket threads don't wait for them
+        self.execution = ExecutionQueue(self.platform)
+        self.user_ws: typing.Optional[websocket.WebSocketApp] = None
+        self.user_stream_connected = False
+        self._listen_key = None
+
+        if "BTCUSDT" in self.contracts:
+            self.subscribe_channel([self.contracts["BTCUSDT"]], "bookTicker")
+
+        # Daemon threads, so that they don't keep the program running when the interface is closed
+        t = threading.Thread(target=self._start_user_stream, daemon=True)
         t.start()
 
+        self._keep_alive_listen_key()
+
         logger.info("Binance Futures Client successfully initialized")
 
     def _add_log(self, msg: str):
         """
-        Add a log to the list so that it can be picked by the update_ui() method of the root component.
+        Add a log to the buffer so that it can be picked by the update_ui() method of the root component.
         :param msg:
         :return:
         """
 
         logger.info("%s", msg)
-        self.logs.append({"log": msg, "displayed": False})
+        self.logs.append(msg)
 
     def _generate_signature(self, data: typing.Dict) -> str:
         """
@@ -98,40 +179,56 @@ class BinanceClient:
     def _make_request(self, method: str, endpoint: str, data: typing.Dict):
         """
         Wrapper that normalizes the requests to the REST API and error handling.
-        :param method: GET, POST, DELETE
+        The request is queued in the scheduler and sent when the rate limits allow it, orders first.
+        :param method: GET, POST, PUT, DELETE
         :param endpoint: Includes the /api/v1 part
         :param data: Parameters of the request
         :return:
         """
 
-        if method == "GET":
-            try:
-                response = requests.get(
-                    self._base_url + endpoint, params=data, headers=self._headers)
-            except Exception as e:  # Takes into account any possible error, most likely network errors
-                logger.error(
-                    "Connection error while making %s request to %s: %s", method, endpoint, e)
-                return None
+        if method not in ["GET", "POST", "PUT", "DELETE"]:
+            raise ValueError()
 
-        elif method == "POST":
-            try:
-                response = requests.post(
-                    self._base_url + endpoint, params=data, headers=self._headers)
-            except Exception as e:
-                logger.error(
-                    "Connection error while making %s request to %s: %s", method, endpoint, e)
-                return None
+        costs = {"weight": ENDPOINT_WEIGHTS.get(endpoint, 1)}
 
-        elif method == "DELETE":
-            try:
-                response = requests.delete(
-                    self._base_url + endpoint, params=data, headers=self._headers)
-            except Exception as e:
-                logger.error(
-                    "Connection error while making %s request to %s: %s", method, endpoint, e)
-                return None
+        if endpoint.endswith("/order") and method in ["POST", "DELETE"]:
+            priority = PRIORITY_ORDER
+            if method == "POST":
+                costs["orders"] = 1
+        elif endpoint.endswith("/klines"):
+            priority = PRIORITY_HISTORY
+        elif endpoint.endswith("/exchangeInfo") or endpoint.endswith("/bookTicker"):
+            priority = PRIORITY_MARKET
         else:
-            raise ValueError()
+            priority = PRIORITY_ACCOUNT
+
+        return self._scheduler.call(priority, costs, lambda: self._send_request(method, endpoint, data))
+
+    def _send_request(self, method: str, endpoint: str, data: typing.Dict):
+        """
+        Make the HTTP request, called by the scheduler.
+        :param method:
+        :param endpoint:
+        :param data:
+        :return:
+        """
+
+        if 'signature' in data:
+            # The request may have waited in the queue, it is signed again so that the timestamp is still
+            # within the recvWindow
+            del data['signature']
+            data['timestamp'] = int(time.time() * 1000)
+            data['signature'] = self._generate_signature(data)
+
+        try:
+            response = self._session.request(method, self._base_url + endpoint, params=data, headers=self._headers,
+                                             timeout=REQUEST_TIMEOUT)
+        except Exception as e:  # Takes into account any possible error, most likely network errors or timeouts
+            logger.error(
+                "Connection error while making %s request to %s: %s", method, endpoint, e)
+            return None
+
+        self._update_rate_limits(response.status_code, response.headers)
 
         if response.status_code == 200:  # 200 is the response code of successful requests
             return response.json()
@@ -140,6 +237,29 @@ class BinanceClient:
                          method, endpoint, response.json(), response.status_code)
             return None
 
+    def _update_rate_limits(self, status_code: int, headers: typing.Mapping[str, str]):
+        """
+        Synchronize the scheduler budgets with the usage counted by Binance.
+        https://binance-docs.github.io/apidocs/spot/en/#limits
+        :param status_code:
+        :param headers: Case-insensitive
+        :return:
+        """
+
+        used_weight = headers.get("X-MBX-USED-WEIGHT-1M")
+        if used_weight is not None:
+            self._scheduler.budgets["weight"].sync(int(used_weight))
+
+        order_count = headers.get("X-MBX-ORDER-COUNT-10S")
+        if order_count is not None:
+            self._scheduler.budgets["orders"].sync(int(order_count))
+
+        if status_code in [418, 429]:  # 429: too many requests, 418: IP banned after repeated 429
+            retry_after = int(headers.get("Retry-After", 60))
+            logger.warning("Binance rate limit exceeded (error code %s), pausing requests for %s seconds",
+                           status_code, retry_after)
+            self._scheduler.block(retry_after)
+
     def get_contracts(self) -> typing.Dict[str, Contract]:
         """
         Get a list of symbols/contracts on the exchange to be displayed in the OptionMenus of the interface.
@@ -160,21 +280,59 @@ class BinanceClient:
                 contracts[contract_data['symbol']] = Contract(
                     contract_data, self.platform)
 
+            for rate_limit in exchange_info.get('rateLimits', []):
+                if rate_limit['rateLimitType'] == "REQUEST_WEIGHT" and rate_limit['interval'] == "MINUTE" \
+                        and rate_limit['intervalNum'] == 1:
+                    self._scheduler.budgets["weight"].limit = rate_limit['limit']
+                elif rate_limit['rateLimitType'] == "ORDERS" and rate_limit['interval'] == "SECOND" \
+                        and rate_limit['intervalNum'] == 10:
+                    self._scheduler.budgets["orders"].limit = rate_limit['limit']
+
         # Sort keys of the dictionary alphabetically
         return collections.OrderedDict(sorted(contracts.items()))
 
-    def get_historical_candles(self, contract: Contract, interval: str) -> typing.List[Candle]:
+    def get_historical_candles_range(self, contract: Contract, interval: str, start_ms: int,
+                                     end_ms: int) -> CandleSeries:
         """
-        Get a list of the most recent candlesticks for a given symbol/contract and interval.
+        Get all the candlesticks between two dates, whatever the number of candles.
         :param contract:
-        :param interval: 1m, 3m, 5m, 15m, 30m, 1h, 2h, 4h, 6h, 8h, 12h, 1d, 3d, 1w, 1M
+        :param interval: One of the TF_EQUIV timeframes
+        :param start_ms: Open time of the first candle, in milliseconds
+        :param end_ms: Open time of the last candle, in milliseconds
         :return:
         """
 
+        return self.get_historical_candles_ranges([contract], interval, start_ms, end_ms)[contract.symbol]
+
+    def get_historical_candles_ranges(self, contracts: typing.List[Contract], interval: str, start_ms: int,
+                                      end_ms: int) -> typing.Dict[str, CandleSeries]:
+        """
+        Same as get_historical_candles_range() for several symbols. The range is split in pages of 1000 candles and
+        all the pages of all the symbols are requested concurrently, the scheduler spreads them within the
+        rate limits after the more urgent requests.
+        :return: Candles of each symbol, sorted and without duplicates
+        """
+
+        tf_ms = TF_EQUIV[interval] * 1000
+        page_ms = 1000 * tf_ms
+        start_ms -= start_ms % tf_ms
+
+        with ThreadPoolExecutor(max_workers=HISTORY_WORKERS) as executor:
+            pages = {contract.symbol: [executor.submit(self._get_candles_page, contract, interval, page_start,
+                                                       min(page_start + page_ms - 1, end_ms))
+                                       for page_start in range(start_ms, end_ms + 1, page_ms)]
+                     for contract in contracts}
+
+            return {symbol: CandleSeries.concatenate([page.result() for page in symbol_pages])
+                    for symbol, symbol_pages in pages.items()}
+
+    def _get_candles_page(self, contract: Contract, interval: str, start_ms: int, end_ms: int) -> CandleSeries:
+
         data = dict()
         data['symbol'] = contract.symbol
         data['interval'] = interval
-        # The maximum number of candles is 1000 on Binance Spot
+        data['startTime'] = start_ms
+        data['endTime'] = end_ms
         data['limit'] = 1000
 
         if self.futures:
@@ -182,18 +340,40 @@ class BinanceClient:
         else:
             raw_candles = self._make_request("GET", "/api/v3/klines", data)
 
-        candles = []
+        if raw_candles is None:
+            logger.warning("Binance: missing %s %s candles between %s and %s", contract.symbol, interval,
+                           start_ms, end_ms)
+            raw_candles = []
+
+        return CandleSeries.from_candles([Candle(c, interval, self.platform) for c in raw_candles])
 
-        if raw_candles is not None:
-            for c in raw_candles:
-                candles.append(Candle(c, interval, self.platform))
+    def get_cached_candles(self, contract: Contract, interval: str,
+                           limit: int = DEFAULT_CANDLE_WINDOW) -> CandleSeries:
+        """
+        Get the most recent candlesticks from the local cache, after requesting the candles created since the last
+        one saved (that one included, it may not have been closed yet).
+        :param contract:
+        :param interval:
+        :param limit: Number of candles
+        :return:
+        """
 
-        return candles
+        now = int(time.time() * 1000)
+        start_ms = now - (limit - 1) * TF_EQUIV[interval] * 1000
 
-    def get_bid_ask(self, contract: Contract) -> typing.Dict[str, float]:
+        last_ts = self._candle_cache.last_timestamp(self.platform, contract.symbol, interval)
+        if last_ts is not None and last_ts > start_ms:
+            start_ms = last_ts
+
+        candles = self.get_historical_candles_range(contract, interval, start_ms, now)
+        self._candle_cache.save(self.platform, contract.symbol, interval, candles)
+
+        return self._candle_cache.get(self.platform, contract.symbol, interval, limit)
+
+    def get_bid_ask(self, contract: Contract) -> PriceSnapshot:
         """
         Get a snapshot of the current bid and ask price for a symbol/contract, to be sure there is something
-        to display in the Watchlist.
+        to display in the Watchlist. Only used if the bookTicker stream hasn't sent a price for the symbol yet.
         :param contract:
         :return:
         """
@@ -209,16 +389,8 @@ class BinanceClient:
                 "GET", "/api/v3/ticker/bookTicker", data)
 
         if ob_data is not None:
-            if contract.symbol not in self.prices:  # Add the symbol to the dictionary if needed
-                self.prices[contract.symbol] = {'bid': float(
-                    ob_data['bidPrice']), 'ask': float(ob_data['askPrice'])}
-            else:
-                self.prices[contract.symbol]['bid'] = float(
-                    ob_data['bidPrice'])
-                self.prices[contract.symbol]['ask'] = float(
-                    ob_data['askPrice'])
-
-            return self.prices[contract.symbol]
+            return self.prices.publish_if_absent(contract.symbol, float(ob_data['bidPrice']),
+                                                 float(ob_data['askPrice']), ob_data.get('time'))
 
     def get_balances(self) -> typing.Dict[str, Balance]:
         """
@@ -378,47 +550,146 @@ class BinanceClient:
 
         return order_status
 
-    def _start_ws(self):
+    def add_strategy(self, b_index: int, strategy: typing.Union[TechnicalStrategy, BreakoutStrategy]) -> bool:
+        """
+        Start a strategy: build the candles of its symbol and timeframe (the history is only loaded if no other
+        strategy already uses them, from the local cache) and route the websocket updates of the symbol to it.
+        Called from the interface thread.
+        :param b_index: Row of the strategy in the strategy component
+        :param strategy:
+        :return: False if no historical data could be retrieved
+        """
+
+        symbol = strategy.contract.symbol
+
+        aggregator = self.aggregators.get(symbol)
+        if aggregator is None:
+            aggregator = CandleAggregator(strategy.exchange, symbol)
+
+        if not aggregator.has_timeframe(strategy.tf):
+            candles = self.get_cached_candles(strategy.contract, strategy.tf)
+
+            if len(candles.timestamp) == 0:
+                return False
+
+            aggregator.load_history(strategy.tf, candles)
+
+        # Open trades left by a previous run, before the strategy receives the trades of its symbol
+        strategy.restore(self.order_journal.replay(strategy.journal_key))
+
+        # Also seeds the indicators of the strategy with the historical data
+        aggregator.subscribe(strategy)
+        self.aggregators[symbol] = aggregator
+
+        strategies = dict(self.strategies)
+        strategies[b_index] = strategy
+        self.strategies = strategies
+
+        symbol_strategies = dict(self.symbol_strategies)
+        symbol_strategies[symbol] = symbol_strategies.get(symbol, tuple()) + (strategy,)
+        self.symbol_strategies = symbol_strategies
+
+        self.subscribe_channel([strategy.contract], "aggTrade")
+        self.subscribe_channel([strategy.contract], "bookTicker")
+
+        return True
+
+    def remove_strategy(self, b_index: int):
         """
-        Infinite loop (thus has to run in a Thread) that reopens the websocket connection in case it drops
+        Stop a strategy, called from the interface thread.
+        :param b_index: Row of the strategy in the strategy component
         :return:
         """
 
-        self.ws = websocket.WebSocketApp(self._wss_url, on_open=self._on_open, on_close=self._on_close,
-                                         on_error=self._on_error, on_message=self._on_message)
+        strategies = dict(self.strategies)
+        strategy = strategies.pop(b_index)
+        self.strategies = strategies
 
-        while True:
-            try:
-                if self.reconnect:  # Reconnect unless the interface is closed by the user
-                    self.ws.run_forever()  # Blocking method that ends only if the websocket connection drops
-                else:
-                    break
-            except Exception as e:
-                logger.error("Binance error in run_forever() method: %s", e)
-            time.sleep(2)
+        symbol = strategy.contract.symbol
 
-    def _on_open(self, ws):
-        logger.info("Binance connection opened")
+        symbol_strategies = dict(self.symbol_strategies)
+        remaining = tuple(s for s in symbol_strategies.get(symbol, tuple()) if s is not strategy)
 
-        self.ws_connected = True
+        if len(remaining) > 0:
+            symbol_strategies[symbol] = remaining
+        else:
+            symbol_strategies.pop(symbol, None)
 
-        # The aggTrade channel is subscribed to in the _switch_strategy() method of strategy_component.py
+        self.symbol_strategies = symbol_strategies
 
-        for channel in ["bookTicker", "aggTrade"]:
-            for symbol in self.ws_subscriptions[channel]:
-                self.subscribe_channel([self.contracts[symbol]], channel)
+        self.aggregators[symbol].unsubscribe(strategy)
 
-        if "BTCUSDT" not in self.ws_subscriptions["bookTicker"]:
-            self.subscribe_channel([self.contracts["BTCUSDT"]], "bookTicker")
+        if self.aggregators[symbol].is_empty():
+            del self.aggregators[symbol]
+            self.unsubscribe_channel([strategy.contract], "aggTrade")
+
+    def get_orders_status(self, orders: typing.Dict[int, Contract]) -> typing.List[OrderStatus]:
+        """
+        Get the status of several orders with one request per symbol (open orders of the symbol). Orders that are
+        not open anymore are then requested individually, only once since they have reached their final status.
+        :param orders: Contract of each order id
+        :return:
+        """
+
+        orders_by_symbol: typing.Dict[str, typing.List[int]] = dict()
+        for order_id, contract in orders.items():
+            orders_by_symbol.setdefault(contract.symbol, []).append(order_id)
+
+        statuses = []
+
+        for symbol, order_ids in orders_by_symbol.items():
+            contract = orders[order_ids[0]]
+
+            data = dict()
+            data['timestamp'] = int(time.time() * 1000)
+            data['symbol'] = symbol
+            data['signature'] = self._generate_signature(data)
+
+            if self.futures:
+                open_orders = self._make_request("GET", "/fapi/v1/openOrders", data)
+            else:
+                open_orders = self._make_request("GET", "/api/v3/openOrders", data)
+
+            if open_orders is None:
+                continue
+
+            open_ids = set()
+
+            for order in open_orders:
+                if order['orderId'] in order_ids:
+                    if not self.futures:
+                        order['avgPrice'] = 0
+                    statuses.append(OrderStatus(order, self.platform))
+                    open_ids.add(order['orderId'])
+
+            for order_id in order_ids:
+                if order_id not in open_ids:
+                    order_status = self.get_order_status(contract, order_id)
+                    if order_status is not None:
+                        statuses.append(order_status)
+
+        return statuses
+
+    @property
+    def ws_connected(self) -> bool:
+        return self._streams.connected
 
-    def _on_close(self, ws):
+    def close(self):
         """
-        Callback method triggered when the connection drops
+        Close the websocket connections without reopening them and wait for the journals to be written, called when
+        the interface is closed.
         :return:
         """
 
-        logger.warning("Binance Websocket connection closed")
-        self.ws_connected = False
+        self.reconnect = False  # Avoids the infinite reconnect loop of the user data stream
+        self._streams.close()
+
+        if self.user_ws is not None:
+            self.user_ws.close()
+
+        # The journals are written by daemon threads, which don't finish their work when the program exits
+        self.order_journal.flush()
+        self.trade_journal.flush()
 
     def _on_error(self, ws, msg: str):
         """
@@ -431,99 +702,256 @@ class BinanceClient:
 
     def _on_message(self, ws, msg: str):
         """
-        The websocket updates of the channels the program subscribed to will go through this callback method
-        :param msg:
+        The websocket updates of the channels the program subscribed to will go through this callback method,
+        from the thread of the connection that received them.
+        :param msg: {"stream": "btcusdt@aggTrade", "data": {...}}
         :return:
         """
 
-        data = json.loads(msg)
+        if not msg.startswith('{"stream":"'):
+            response = self._decode(msg)
+            if response.get('error') is not None:
+                logger.error("Binance websocket error: %s", response['error'])
+            return
+
+        stream = msg[11:msg.find('"', 11)]
+
+        if stream.endswith("@aggTrade") and stream[:-9].upper() not in self.aggregators:
+            # Trades of a symbol without strategy are skipped before decoding the whole message
+            return
+
+        data = self._decode(msg)['data']
 
         if "u" in data and "A" in data:
             # For Binance Spot, to make the data structure uniform with Binance Futures
             data['e'] = "bookTicker"
             # See the data structure difference here: https://binance-docs.github.io/apidocs/spot/en/#individual-symbol-book-ticker-streams
 
-        if "e" in data:
-            if data['e'] == "bookTicker":
+        if "e" in data and "s" in data:
+            self._dispatcher.submit(data['s'], data)
 
-                symbol = data['s']
+    def _process_market_data(self, updates: typing.List[typing.Dict]):
+        """
+        Called by a worker thread of the dispatcher with the updates received for its symbols, oldest first.
+        Consecutive trades of a symbol are added to the candles together: they are collected until a bid/ask update
+        of the same symbol (or the end of the updates), so the order of the updates of each symbol is kept.
+        An error only loses the update (or the collected trades) where it happened.
+        :param updates: Websocket data of bookTicker and aggTrade streams
+        :return:
+        """
 
-                if symbol not in self.prices:
-                    self.prices[symbol] = {'bid': float(
-                        data['b']), 'ask': float(data['a'])}
-                else:
-                    self.prices[symbol]['bid'] = float(data['b'])
-                    self.prices[symbol]['ask'] = float(data['a'])
-
-                # PNL Calculation
-
-                try:
-                    for b_index, strat in self.strategies.items():
-                        if strat.contract.symbol == symbol:
-                            for trade in strat.trades:
-                                if trade.status == "open" and trade.entry_price is not None:
-                                    if trade.side == "long":
-                                        trade.pnl = (
-                                            self.prices[symbol]['bid'] - trade.entry_price) * trade.quantity
-                                    elif trade.side == "short":
-                                        trade.pnl = (
-                                            trade.entry_price - self.prices[symbol]['ask']) * trade.quantity
-                except RuntimeError as e:  # Handles the case  the dictionary is modified while loop through it
-                    logger.error(
-                        "Error while looping through the Binance strategies: %s", e)
-
-            if data['e'] == "aggTrade":
-
-                symbol = data['s']
-
-                for key, strat in self.strategies.items():
-                    if strat.contract.symbol == symbol:
-                        res = strat.parse_trades(float(data['p']), float(
-                            data['q']), data['T'])  # Updates candlesticks
-                        strat.check_trade(res)
+        trades: typing.Dict[str, typing.Tuple[typing.List[float], typing.List[float], typing.List[int]]] = dict()
+
+        for data in updates:
+
+            symbol = data['s']
+
+            try:
+                if data['e'] == "bookTicker":
+
+                    # The trades received before this update are processed first
+                    if symbol in trades:
+                        self._add_trades(symbol, *trades.pop(symbol))
+
+                    bid = float(data['b'])
+                    ask = float(data['a'])
+
+                    self.prices.publish(symbol, bid, ask, data.get('T'))  # No transaction time on Binance Spot
+
+                    # PNL Calculation
+
+                    for strat in self.symbol_strategies.get(symbol, tuple()):
+                        for trade in strat.trades:
+                            if trade.status == "open" and trade.entry_price is not None:
+                                if trade.side == "long":
+                                    pnl = (bid - trade.entry_price) * trade.quantity
+                                else:
+                                    pnl = (trade.entry_price - ask) * trade.quantity
+
+                                if pnl != trade.pnl:
+                                    trade.pnl = pnl
+                                    strat.trade_changed(trade)
+
+                elif data['e'] == "aggTrade":
+
+                    if data['a'] <= self._last_agg_trade_ids.get(symbol, -1):
+                        continue
+
+                    price = float(data['p'])
+                    size = float(data['q'])
+
+                    self._last_agg_trade_ids[symbol] = data['a']
+
+                    if symbol not in trades:
+                        trades[symbol] = ([], [], [])
+
+                    prices, sizes, timestamps = trades[symbol]
+                    prices.append(price)
+                    sizes.append(size)
+                    timestamps.append(data['T'])
+
+            except Exception as e:
+                logger.error("Binance error while processing a %s update of %s: %s", data.get('e'), symbol, e)
+
+        for symbol, (prices, sizes, timestamps) in trades.items():
+            self._add_trades(symbol, prices, sizes, timestamps)
+
+    def _add_trades(self, symbol: str, prices: typing.List[float], sizes: typing.List[float],
+                    timestamps: typing.List[int]):
+        """
+        Updates the candlesticks of the symbol and notifies the strategies.
+        :param symbol:
+        :param prices: Trades of the symbol, oldest first
+        :param sizes:
+        :param timestamps:
+        :return:
+        """
+
+        aggregator = self.aggregators.get(symbol)
+
+        if aggregator is None:
+            return
+
+        try:
+            if len(prices) == 1:
+                aggregator.on_trade(prices[0], sizes[0], timestamps[0])
+            else:
+                aggregator.on_trades(prices, sizes, timestamps)
+        except Exception as e:
+            logger.error("Binance error while processing %s trades of %s: %s", len(prices), symbol, e)
+
+    def _get_listen_key(self) -> typing.Optional[str]:
+        """
+        Create (or extend if it already exists) the listen key needed to connect to the user data stream.
+        :return:
+        """
+
+        if self.futures:
+            data = self._make_request("POST", "/fapi/v1/listenKey", dict())
+        else:
+            data = self._make_request("POST", "/api/v3/userDataStream", dict())
+
+        if data is not None:
+            return data['listenKey']
+
+    def _keep_alive_listen_key(self):
+        """
+        The listen key expires 60 minutes after its creation unless it is kept alive, so this is called every
+        30 minutes.
+        :return:
+        """
+
+        if self._listen_key is not None:
+            if self.futures:
+                self._make_request("PUT", "/fapi/v1/listenKey", dict())
+            else:
+                self._make_request("PUT", "/api/v3/userDataStream", {'listenKey': self._listen_key})
+
+        t = threading.Timer(1800, self._keep_alive_listen_key)
+        t.daemon = True
+        t.start()
+
+    def _start_user_stream(self):
+        """
+        Infinite loop, like _start_ws(), that keeps the user data stream connection open.
+        https://binance-docs.github.io/apidocs/spot/en/#user-data-streams
+        :return:
+        """
+
+        while True:
+            try:
+                if not self.reconnect:
+                    break
+
+                self._listen_key = self._get_listen_key()
+
+                if self._listen_key is not None:
+                    self.user_ws = websocket.WebSocketApp(self._wss_url + "/" + self._listen_key,
+                                                          on_open=self._on_user_open, on_close=self._on_user_close,
+                                                          on_error=self._on_error, on_message=self._on_user_message)
+                    self.user_ws.run_forever()
+            except Exception as e:
+                logger.error("Binance error in the user data stream: %s", e)
+
+            self.user_stream_connected = False
+            time.sleep(2)
+
+    def _on_user_open(self, ws):
+        logger.info("Binance user data stream opened")
+        self.user_stream_connected = True
+
+    def _on_user_close(self, ws):
+        logger.warning("Binance user data stream closed")
+        self.user_stream_connected = False
+
+    def _on_user_message(self, ws, msg: str):
+        """
+        Order updates of the account, sent to the strategy that placed the order.
+        :param msg:
+        :return:
+        """
+
+        data = self._decode(msg)
+
+        if "e" not in data:
+            return
+
+        if data['e'] == "executionReport":  # Binance Spot
+            executed_qty = float(data['z'])
+            avg_price = float(data['Z']) / executed_qty if executed_qty > 0 else 0
+
+            if data['s'] in self.contracts:
+                tick_size = self.contracts[data['s']].tick_size
+                avg_price = round(round(avg_price / tick_size) * tick_size, 8)
+
+            order_info = {'orderId': data['i'], 'status': data['X'], 'avgPrice': avg_price, 'executedQty': executed_qty}
+
+        elif data['e'] == "ORDER_TRADE_UPDATE":  # Binance Futures
+            order_info = {'orderId': data['o']['i'], 'status': data['o']['X'], 'avgPrice': data['o']['ap'],
+                          'executedQty': data['o']['z']}
+
+        elif data['e'] == "listenKeyExpired":
+            logger.warning("Binance listen key expired, reconnecting the user data stream")
+            ws.close()
+            return
+
+        else:
+            return
+
+        self.order_tracker.on_update(OrderStatus(order_info, self.platform))
 
     def subscribe_channel(self, contracts: typing.List[Contract], channel: str):
         """
         Subscribe to updates on a specific topic for all the symbols.
-        If your list is bigger than 300 symbols, the subscription will fail (observed on Binance Spot).
+        The streams are spread over several connections, the subscriptions are sent when the connections are open.
         :param contracts:
         :param channel: aggTrades, bookTicker...
         :return:
         """
 
-        if len(contracts) > 200:
-            logger.warning("Subscribing to more than 200 symbols will most likely fail. "
-                           "Consider subscribing only when adding a symbol to your Watchlist or when starting a "
-                           "strategy for a symbol.")
+        if len(contracts) == 0:
+            self._streams.subscribe([channel])
+            return
 
-        data = dict()
-        data['method'] = "SUBSCRIBE"
-        data['params'] = []
+        streams = []
 
-        if len(contracts) == 0:
-            data['params'].append(channel)
-        else:
-            for contract in contracts:
-                if contract.symbol not in self.ws_subscriptions[channel]:
-                    data['params'].append(
-                        contract.symbol.lower() + "@" + channel)
-                    self.ws_subscriptions[channel].append(contract.symbol)
+        for contract in contracts:
+            if contract.symbol not in self.ws_subscriptions[channel]:
+                streams.append(contract.symbol.lower() + "@" + channel)
+                self.ws_subscriptions[channel].add(contract.symbol)
 
-            if len(data['params']) == 0:
-                return
+        self._streams.subscribe(streams)
 
-        data['id'] = self._ws_id
+    def unsubscribe_channel(self, contracts: typing.List[Contract], channel: str):
 
-        try:
-            # Converts the JSON object (dictionary) to a JSON string
-            self.ws.send(json.dumps(data))
-            logger.info("Binance: subscribing to: %s",
-                        ','.join(data['params']))
-        except Exception as e:
-            logger.error(
-                "Websocket error while subscribing to @bookTicker and @aggTrade: %s", e)
+        streams = []
+
+        for contract in contracts:
+            if contract.symbol in self.ws_subscriptions[channel]:
+                streams.append(contract.symbol.lower() + "@" + channel)
+                self.ws_subscriptions[channel].discard(contract.symbol)
 
-        self._ws_id += 1
+        self._streams.unsubscribe(streams)
 
     def get_trade_size(self, contract: Contract, price: float, balance_pct: float):
         """
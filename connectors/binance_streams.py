@@ -0,0 +1,275 @@
+import logging
+import typing
+import time
+import json
+import itertools
+import threading
+
+import websocket
+
+
+logger = logging.getLogger()
+
+MAX_STREAMS_PER_SHARD = 200  # Binance Futures accepts 200 streams per connection, more fails on Binance Spot too
+SEND_INTERVAL = 0.25  # Seconds between two messages sent on a connection, Binance closes it above 5 messages/second
+
+
+class StreamShard:
+    """
+    One websocket connection to the combined stream endpoint, read by its own thread. Messages are wrapped like:
+    {"stream": "btcusdt@aggTrade", "data": {...}}
+    The streams are subscribed again when the connection reopens. Subscribe/unsubscribe requests are grouped and
+    spaced so that the connection doesn't exceed the incoming messages limit.
+    """
+
+    def __init__(self, url: str, on_message: typing.Callable, name: str):
+        """
+        :param url: e.g: wss://fstream.binance.com/stream
+        :param on_message: Called with (ws, msg) for every message, from the thread of the shard
+        :param name: Used in the logs
+        """
+
+        self.name = name
+        self.streams: typing.Set[str] = set()
+        self.connected = False
+
+        self._url = url
+        self._on_message = on_message
+        self._reconnect = True
+
+        self._ws: typing.Optional[websocket.WebSocketApp] = None
+        self._ws_id = itertools.count(1)
+
+        self._lock = threading.Lock()
+        self._to_subscribe: typing.Set[str] = set()
+        self._to_unsubscribe: typing.Set[str] = set()
+        self._flush_timer: typing.Optional[threading.Timer] = None
+        self._last_send = 0.0
+
+        t = threading.Thread(target=self._start_ws, daemon=True)
+        t.start()
+
+    def __len__(self) -> int:
+        return len(self.streams)
+
+    def subscribe(self, streams: typing.Iterable[str]):
+        with self._lock:
+            for stream in streams:
+                if stream not in self.streams:
+                    self.streams.add(stream)
+                    self._to_subscribe.add(stream)
+                    self._to_unsubscribe.discard(stream)
+
+            self._schedule_flush()
+
+    def unsubscribe(self, streams: typing.Iterable[str]):
+        with self._lock:
+            for stream in streams:
+                if stream in self.streams:
+                    self.streams.discard(stream)
+                    self._to_unsubscribe.add(stream)
+                    self._to_subscribe.discard(stream)
+
+            self._schedule_flush()
+
+    def close(self):
+        self._reconnect = False
+
+        if self._ws is not None:
+            self._ws.close()
+
+    def _start_ws(self):
+        """
+        Infinite loop (thus has to run in a Thread) that reopens the websocket connection in case it drops
+        :return:
+        """
+
+        while self._reconnect:  # Reconnect unless the shard is closed
+            try:
+                self._ws = websocket.WebSocketApp(self._url, on_open=self._on_open, on_close=self._on_close,
+                                                  on_error=self._on_error, on_message=self._on_message)
+                self._ws.run_forever()  # Blocking method that ends only if the websocket connection drops
+            except Exception as e:
+                logger.error("Binance %s error in run_forever() method: %s", self.name, e)
+
+            self.connected = False
+            time.sleep(2)
+
+    def _on_open(self, ws):
+        logger.info("Binance %s connection opened", self.name)
+
+        with self._lock:
+            self.connected = True
+            self._to_subscribe = set(self.streams)
+            self._to_unsubscribe.clear()
+            self._schedule_flush()
+
+    def _on_close(self, ws):
+        logger.warning("Binance %s websocket connection closed", self.name)
+        self.connected = False
+
+    def _on_error(self, ws, msg: str):
+        logger.error("Binance %s connection error: %s", self.name, msg)
+
+    def _schedule_flush(self):
+        """
+        Must be called with the lock held.
+        """
+
+        if self._flush_timer is not None or not self.connected:
+            return
+
+        if len(self._to_subscribe) == 0 and len(self._to_unsubscribe) == 0:
+            return
+
+        self._flush_timer = threading.Timer(max(0.0, self._last_send + SEND_INTERVAL - time.time()), self._flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _flush(self):
+        """
+        Send one SUBSCRIBE or UNSUBSCRIBE request with all the pending streams.
+        """
+
+        with self._lock:
+            self._flush_timer = None
+
+            if not self.connected:
+                return
+
+            data = dict()
+
+            if len(self._to_subscribe) > 0:
+                data['method'] = "SUBSCRIBE"
+                data['params'] = sorted(self._to_subscribe)
+                self._to_subscribe.clear()
+            elif len(self._to_unsubscribe) > 0:
+                data['method'] = "UNSUBSCRIBE"
+                data['params'] = sorted(self._to_unsubscribe)
+                self._to_unsubscribe.clear()
+            else:
+                return
+
+            data['id'] = next(self._ws_id)
+
+            try:
+                self._ws.send(json.dumps(data))
+                logger.info("Binance %s: %s %s", self.name, data['method'].lower(), ','.join(data['params']))
+            except Exception as e:
+                logger.error("Websocket error while sending a %s request: %s", data['method'], e)
+
+            self._last_send = time.time()
+
+            self._schedule_flush()
+
+
+class CombinedStreams:
+    """
+    Spreads the market data streams over several connections (shards) of at most MAX_STREAMS_PER_SHARD streams.
+    New streams go to the least loaded shard. When the streams left after unsubscribing fit in one shard less,
+    the least loaded shard is emptied into the others and closed.
+    """
+
+    def __init__(self, url: str, on_message: typing.Callable, max_streams: int = MAX_STREAMS_PER_SHARD):
+        """
+        :param url: Combined stream endpoint, e.g: wss://fstream.binance.com/stream
+        :param on_message: Called with (ws, msg) for every message, from the thread of the shard that received it
+        :param max_streams: Maximum number of streams per connection
+        """
+
+        self._url = url
+        self._on_message = on_message
+        self._max_streams = max_streams
+
+        self._shards: typing.List[StreamShard] = []
+        self._shard_of: typing.Dict[str, StreamShard] = dict()
+        self._shard_id = itertools.count(1)
+
+        self._lock = threading.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return any(shard.connected for shard in self._shards)
+
+    def subscribe(self, streams: typing.List[str]):
+        with self._lock:
+            additions: typing.Dict[StreamShard, typing.List[str]] = dict()
+
+            for stream in streams:
+                if stream in self._shard_of:
+                    continue
+
+                shard = self._least_loaded_shard(additions)
+                additions.setdefault(shard, []).append(stream)
+                self._shard_of[stream] = shard
+
+            for shard, shard_streams in additions.items():
+                shard.subscribe(shard_streams)
+
+    def unsubscribe(self, streams: typing.List[str]):
+        with self._lock:
+            removals: typing.Dict[StreamShard, typing.List[str]] = dict()
+
+            for stream in streams:
+                shard = self._shard_of.pop(stream, None)
+                if shard is not None:
+                    removals.setdefault(shard, []).append(stream)
+
+            for shard, shard_streams in removals.items():
+                shard.unsubscribe(shard_streams)
+
+            self._rebalance()
+
+    def close(self):
+        with self._lock:
+            for shard in self._shards:
+                shard.close()
+
+    def _least_loaded_shard(self, additions: typing.Dict[StreamShard, typing.List[str]]) -> StreamShard:
+        """
+        Must be called with the lock held.
+        """
+
+        shard = None
+
+        if len(self._shards) > 0:
+            shard = min(self._shards, key=lambda s: len(s) + len(additions.get(s, [])))
+
+        if shard is None or len(shard) + len(additions.get(shard, [])) >= self._max_streams:
+            shard = StreamShard(self._url, self._on_message, f"stream shard {next(self._shard_id)}")
+            self._shards.append(shard)
+
+        return shard
+
+    def _rebalance(self):
+        """
+        Must be called with the lock held.
+        The streams are subscribed on their new shard before the old one is closed, the messages received twice
+        meanwhile must be ignored by the connector.
+        """
+
+        if len(self._shards) < 2 or len(self._shard_of) > (len(self._shards) - 1) * self._max_streams:
+            return
+
+        emptied = min(self._shards, key=len)
+        self._shards.remove(emptied)
+
+        moved = sorted(emptied.streams)
+
+        while len(moved) > 0:
+            shard = min(self._shards, key=len)
+            count = min(len(moved), self._max_streams - len(shard))
+
+            shard.subscribe(moved[:count])
+            for stream in moved[:count]:
+                self._shard_of[stream] = shard
+
+            moved = moved[count:]
+
+        # Kept open until the other shards have subscribed to its streams
+        t = threading.Timer(2 * SEND_INTERVAL + 1, emptied.close)
+        t.daemon = True
+        t.start()
+
+        logger.info("Binance: %s closed, %s streams on %s connections", emptied.name, len(self._shard_of),
+                    len(self._shards))
@@ -1,5 +1,4 @@
 import logging
-import requests
 import time
 import typing
 import collections
@@ -12,17 +11,35 @@ import hashlib
 import websocket
 import json
 
-import dateutil.parser
-
 import threading
+import datetime
+
+from concurrent.futures import ThreadPoolExecutor
 
 from models import *
 
 from strategies import TechnicalStrategy, BreakoutStrategy
+from buffers import CandleSeries, LogBuffer, DEFAULT_CANDLE_WINDOW
+from database import CandleCache, TradeJournal, OrderJournal
+from aggregator import CandleAggregator
+from connectors.http_session import create_session, REQUEST_TIMEOUT
+from connectors.order_tracker import OrderTracker, FINAL_STATUSES
+from connectors.decoding import get_decoder
+from connectors.execution import ExecutionQueue
+from connectors.dispatcher import SymbolDispatcher
+from connectors.price_board import PriceBoard
+from connectors.rate_limiter import RateBudget, RequestScheduler, PRIORITY_ORDER, PRIORITY_ACCOUNT, \
+    PRIORITY_MARKET, PRIORITY_HISTORY
 
 
 logger = logging.getLogger()
 
+HISTORY_WORKERS = 8  # Pages of historical candles requested at the same time
+
+
+def _to_iso_time(ms: int) -> str:
+    return datetime.datetime.utcfromtimestamp(ms / 1000).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
 
 class BitmexClient:
     def __init__(self, public_key: str, secret_key: str, testnet: bool):
@@ -47,17 +64,62 @@ class BitmexClient:
         self._public_key = public_key
         self._secret_key = secret_key
 
+        # Keeps the connections to the REST API open between requests
+        self._session = create_session()
+
+        self._candle_cache = CandleCache()
+
+        # Closed trades of the strategies
+        self.trade_journal = TradeJournal()
+
+        # Order events of the strategies, replayed when a strategy is started to restore its open trades
+        self.order_journal = OrderJournal()
+
+        # Every request costs 1, the order routes are also limited per second.
+        # https://www.bitmex.com/app/restAPI#Limits
+        self._scheduler = RequestScheduler({"requests": RateBudget(120, 60), "orders": RateBudget(10, 1)})
+
         self.ws: websocket.WebSocketApp
         self.reconnect = True
+        self.ws_connected = False
+
+        # Market data topics are scoped to the symbols of the Watchlist and of the running strategies
+        self._watchlist: typing.Set[str] = set()
+        self._ws_topics: typing.Set[str] = set()  # Subscribed to on the current connection
+        self._topics_lock = threading.Lock()
 
         self.contracts = self.get_contracts()
         self.balances = self.get_balances()
 
-        self.prices = dict()
+        # Latest bid/ask of each symbol, read by the interface thread without lock
+        self.prices = PriceBoard()
+
+        # Replaced by a new dictionary when a strategy is added/removed, like symbol_strategies below
         self.strategies: typing.Dict[int,
                                      typing.Union[TechnicalStrategy, BreakoutStrategy]] = dict()
 
-        self.logs = []
+        # One candle builder per symbol, shared by all the strategies running on this symbol
+        self.aggregators: typing.Dict[str, CandleAggregator] = dict()
+
+        # Strategies running on each symbol, used to dispatch the websocket updates.
+        # Replaced by a new dictionary when a strategy is added/removed, so the websocket thread can loop through it.
+        self.symbol_strategies: typing.Dict[str, typing.Tuple[typing.Union[TechnicalStrategy,
+                                                                           BreakoutStrategy], ...]] = dict()
+
+        self.logs = LogBuffer()
+
+        # Order updates of the account, received from the 'order' and 'execution' websocket tables
+        self.order_tracker = OrderTracker(self)
+
+        # Orders of the strategies, sent from a separate thread so that the websocket threads don't wait for them
+        self.execution = ExecutionQueue(self.platform)
+        self.user_stream_connected = False
+        self._orders: typing.Dict[str, typing.Dict] = dict()  # Order table rows, updates only contain changed fields
+
+        self._decode = get_decoder()
+
+        # Candles, PNL and strategies are updated by several threads, each symbol always by the same one
+        self._dispatcher = SymbolDispatcher(self.platform, self._process_market_data)
 
         t = threading.Thread(target=self._start_ws)
         t.start()
@@ -66,7 +128,7 @@ class BitmexClient:
 
     def _add_log(self, msg: str):
         logger.info("%s", msg)
-        self.logs.append({"log": msg, "displayed": False})
+        self.logs.append(msg)
 
     def _generate_signature(self, method: str, endpoint: str, expires: str, data: typing.Dict) -> str:
 
@@ -77,6 +139,26 @@ class BitmexClient:
 
     def _make_request(self, method: str, endpoint: str, data: typing.Dict):
 
+        if method not in ["GET", "POST", "PUT", "DELETE"]:
+            raise ValueError()
+
+        costs = {"requests": 1}
+
+        if endpoint == "/api/v1/order" and method in ["POST", "DELETE"]:
+            priority = PRIORITY_ORDER
+            costs["orders"] = 1
+        elif endpoint == "/api/v1/trade/bucketed":
+            priority = PRIORITY_HISTORY
+        elif endpoint == "/api/v1/instrument/active":
+            priority = PRIORITY_MARKET
+        else:
+            priority = PRIORITY_ACCOUNT
+
+        return self._scheduler.call(priority, costs, lambda: self._send_request(method, endpoint, data))
+
+    def _send_request(self, method: str, endpoint: str, data: typing.Dict):
+
+        # Signed when the scheduler sends the request, not when it is queued, so that it doesn't expire
         headers = dict()
         expires = str(int(time.time()) + 5)
         headers['api-expires'] = expires
@@ -84,34 +166,15 @@ class BitmexClient:
         headers['api-signature'] = self._generate_signature(
             method, endpoint, expires, data)
 
-        if method == "GET":
-            try:
-                response = requests.get(
-                    self._base_url + endpoint, params=data, headers=headers)
-            except Exception as e:
-                logger.error(
-                    "Connection error while making %s request to %s: %s", method, endpoint, e)
-                return None
-
-        elif method == "POST":
-            try:
-                response = requests.post(
-                    self._base_url + endpoint, params=data, headers=headers)
-            except Exception as e:
-                logger.error(
-                    "Connection error while making %s request to %s: %s", method, endpoint, e)
-                return None
+        try:
+            response = self._session.request(method, self._base_url + endpoint, params=data, headers=headers,
+                                             timeout=REQUEST_TIMEOUT)
+        except Exception as e:  # Takes into account any possible error, most likely network errors or timeouts
+            logger.error(
+                "Connection error while making %s request to %s: %s", method, endpoint, e)
+            return None
 
-        elif method == "DELETE":
-            try:
-                response = requests.delete(
-                    self._base_url + endpoint, params=data, headers=headers)
-            except Exception as e:
-                logger.error(
-                    "Connection error while making %s request to %s: %s", method, endpoint, e)
-                return None
-        else:
-            raise ValueError()
+        self._update_rate_limits(response.status_code, response.headers)
 
         if response.status_code == 200:
             return response.json()
@@ -120,6 +183,32 @@ class BitmexClient:
                          method, endpoint, response.json(), response.status_code)
             return None
 
+    def _update_rate_limits(self, status_code: int, headers: typing.Mapping[str, str]):
+        """
+        Synchronize the scheduler budgets with the remaining requests counted by Bitmex.
+        :param status_code:
+        :param headers: Case-insensitive
+        :return:
+        """
+
+        requests_budget = self._scheduler.budgets["requests"]
+
+        if "x-ratelimit-limit" in headers:
+            requests_budget.limit = int(headers["x-ratelimit-limit"])
+
+        if "x-ratelimit-remaining" in headers and "x-ratelimit-reset" in headers:
+            requests_budget.sync(requests_budget.limit - int(headers["x-ratelimit-remaining"]),
+                                 float(headers["x-ratelimit-reset"]))
+
+        if "x-ratelimit-remaining-1s" in headers:
+            orders_budget = self._scheduler.budgets["orders"]
+            orders_budget.sync(orders_budget.limit - int(headers["x-ratelimit-remaining-1s"]))
+
+        if status_code == 429:
+            retry_after = int(headers.get("Retry-After", 60))
+            logger.warning("Bitmex rate limit exceeded, pausing requests for %s seconds", retry_after)
+            self._scheduler.block(retry_after)
+
     def get_contracts(self) -> typing.Dict[str, Contract]:
 
         instruments = self._make_request(
@@ -148,27 +237,85 @@ class BitmexClient:
 
         return balances
 
-    def get_historical_candles(self, contract: Contract, timeframe: str) -> typing.List[Candle]:
-        data = dict()
+    def get_historical_candles_range(self, contract: Contract, timeframe: str, start_ms: int,
+                                     end_ms: int) -> CandleSeries:
+        """
+        See comments in the Binance connector.
+        :param contract:
+        :param timeframe: 1m, 5m, 1h or 1d
+        :param start_ms: Open time of the first candle, in milliseconds
+        :param end_ms: Open time of the last candle, in milliseconds
+        :return:
+        """
+
+        return self.get_historical_candles_ranges([contract], timeframe, start_ms, end_ms)[contract.symbol]
+
+    def get_historical_candles_ranges(self, contracts: typing.List[Contract], timeframe: str, start_ms: int,
+                                      end_ms: int) -> typing.Dict[str, CandleSeries]:
+
+        tf_ms = BITMEX_TF_MINUTES[timeframe] * 60000
+        page_ms = 1000 * tf_ms
+        start_ms -= start_ms % tf_ms
+
+        with ThreadPoolExecutor(max_workers=HISTORY_WORKERS) as executor:
+            pages = {contract.symbol: [executor.submit(self._get_candles_page, contract, timeframe, page_start,
+                                                       min(page_start + page_ms - 1, end_ms))
+                                       for page_start in range(start_ms, end_ms + 1, page_ms)]
+                     for contract in contracts}
+
+            return {symbol: CandleSeries.concatenate([page.result() for page in symbol_pages])
+                    for symbol, symbol_pages in pages.items()}
+
+    def _get_candles_page(self, contract: Contract, timeframe: str, start_ms: int, end_ms: int) -> CandleSeries:
 
+        # The timestamp of a Bitmex bucket is its close time
+        tf_ms = BITMEX_TF_MINUTES[timeframe] * 60000
+
+        data = dict()
         data['symbol'] = contract.symbol
         data['partial'] = True
         data['binSize'] = timeframe
-        data['count'] = 500
-        data['reverse'] = True
+        data['startTime'] = _to_iso_time(start_ms + tf_ms)
+        data['endTime'] = _to_iso_time(end_ms + tf_ms)
+        data['count'] = 1000
 
         raw_candles = self._make_request("GET", "/api/v1/trade/bucketed", data)
 
-        candles = []
+        if raw_candles is None:
+            logger.warning("Bitmex: missing %s %s candles between %s and %s", contract.symbol, timeframe,
+                           start_ms, end_ms)
+            raw_candles = []
+
+        # Some candles returned by Bitmex miss data
+        return CandleSeries.from_candles([Candle(c, timeframe, "bitmex") for c in raw_candles
+                                          if c['open'] is not None and c['close'] is not None])
+
+    def get_cached_candles(self, contract: Contract, timeframe: str,
+                           limit: int = DEFAULT_CANDLE_WINDOW) -> CandleSeries:
+        """
+        Get the most recent candlesticks from the local cache, after requesting the candles created since the last
+        one saved (that one included, it may not have been closed yet).
+        :param contract:
+        :param timeframe:
+        :param limit: Number of candles
+        :return:
+        """
+
+        if timeframe not in BITMEX_TF_MINUTES:
+            logger.warning("Bitmex: the %s timeframe is not available", timeframe)
+            return CandleSeries.from_candles([])
+
+        now = int(time.time() * 1000)
+        start_ms = now - (limit - 1) * BITMEX_TF_MINUTES[timeframe] * 60000
+
+        last_ts = self._candle_cache.last_timestamp(self.platform, contract.symbol, timeframe)
+        if last_ts is not None and last_ts > start_ms:
+            start_ms = last_ts
 
-        if raw_candles is not None:
-            for c in reversed(raw_candles):
-                # Some candles returned by Bitmex miss data
-                if c['open'] is None or c['close'] is None:
-                    continue
-                candles.append(Candle(c, timeframe, "bitmex"))
+        candles = self.get_historical_candles_range(contract, timeframe, start_ms, now)
+        self._candle_cache.save(self.platform, contract.symbol, timeframe, candles)
 
-        return candles
+        return self._candle_cache.get(self.platform, contract.symbol, timeframe, limit)
 
     def place_order(self, contract: Contract, order_type: str, quantity: int, side: str, price=None, tif=None) -> OrderStatus:
         data = dict()
@@ -217,6 +364,100 @@ class BitmexClient:
                 if order['orderID'] == order_id:
                     return OrderStatus(order, "bitmex")
 
+    def add_strategy(self, b_index: int, strategy: typing.Union[TechnicalStrategy, BreakoutStrategy]) -> bool:
+        """
+        Start a strategy: build the candles of its symbol and timeframe (the history is only loaded if no other
+        strategy already uses them, from the local cache) and route the websocket updates of the symbol to it.
+        Called from the interface thread.
+        :param b_index: Row of the strategy in the strategy component
+        :param strategy:
+        :return: False if no historical data could be retrieved
+        """
+
+        symbol = strategy.contract.symbol
+
+        aggregator = self.aggregators.get(symbol)
+        if aggregator is None:
+            aggregator = CandleAggregator(strategy.exchange, symbol)
+
+        if not aggregator.has_timeframe(strategy.tf):
+            candles = self.get_cached_candles(strategy.contract, strategy.tf)
+
+            if len(candles.timestamp) == 0:
+                return False
+
+            aggregator.load_history(strategy.tf, candles)
+
+        # Open trades left by a previous run, before the strategy receives the trades of its symbol
+        strategy.restore(self.order_journal.replay(strategy.journal_key))
+
+        # Also seeds the indicators of the strategy with the historical data
+        aggregator.subscribe(strategy)
+        self.aggregators[symbol] = aggregator
+
+        strategies = dict(self.strategies)
+        strategies[b_index] = strategy
+        self.strategies = strategies
+
+        symbol_strategies = dict(self.symbol_strategies)
+        symbol_strategies[symbol] = symbol_strategies.get(symbol, tuple()) + (strategy,)
+        self.symbol_strategies = symbol_strategies
+
+        self._sync_subscriptions()
+
+        return True
+
+    def remove_strategy(self, b_index: int):
+        """
+        Stop a strategy, called from the interface thread.
+        :param b_index: Row of the strategy in the strategy component
+        :return:
+        """
+
+        strategies = dict(self.strategies)
+        strategy = strategies.pop(b_index)
+        self.strategies = strategies
+
+        symbol = strategy.contract.symbol
+
+        symbol_strategies = dict(self.symbol_strategies)
+        remaining = tuple(s for s in symbol_strategies.get(symbol, tuple()) if s is not strategy)
+
+        if len(remaining) > 0:
+            symbol_strategies[symbol] = remaining
+        else:
+            symbol_strategies.pop(symbol, None)
+
+        self.symbol_strategies = symbol_strategies
+
+        self._sync_subscriptions()
+
+        self.aggregators[symbol].unsubscribe(strategy)
+
+        if self.aggregators[symbol].is_empty():
+            del self.aggregators[symbol]
+
+    def get_orders_status(self, orders: typing.Dict[str, Contract]) -> typing.List[OrderStatus]:
+        """
+        Get the status of several orders, whatever their symbol, with one request filtered on their ids.
+        :param orders: Contract of each order id
+        :return:
+        """
+
+        data = dict()
+        data['filter'] = json.dumps({"orderID": list(orders.keys())})
+        data['count'] = len(orders)
+
+        order_status = self._make_request("GET", "/api/v1/order", data)
+
+        statuses = []
+
+        if order_status is not None:
+            for order in order_status:
+                statuses.append(OrderStatus(order, "bitmex"))
+
+        return statuses
+
     def _start_ws(self):
         self.ws = websocket.WebSocketApp(self._wss_url, on_open=self._on_open, on_close=self._on_close,
                                          on_error=self._on_error, on_message=self._on_message)
@@ -231,95 +472,271 @@ class BitmexClient:
                 logger.error("Bitmex error in run_forever() method: %s", e)
             time.sleep(2)
 
+    def close(self):
+        """
+        Close the websocket connection without reopening it and wait for the journals to be written, called when the
+        interface is closed.
+        :return:
+        """
+
+        self.reconnect = False  # Avoids the infinite reconnect loop in _start_ws()
+        self.ws.close()
+
+        # The journals are written by daemon threads, which don't finish their work when the program exits
+        self.order_journal.flush()
+        self.trade_journal.flush()
+
     def _on_open(self, ws):
         logger.info("Bitmex connection opened")
 
-        self.subscribe_channel("instrument")
-        self.subscribe_channel("trade")
+        with self._topics_lock:
+            self.ws_connected = True
+            self._ws_topics = set()
+
+        self._sync_subscriptions()
+
+        # Private topics, the connection has to be authenticated first
+        self._authenticate()
+        self.subscribe_channel(["execution", "order"])
 
     def _on_close(self, ws):
         logger.warning("Bitmex Websocket connection closed")
+        self.ws_connected = False
+        self.user_stream_connected = False
 
     def _on_error(self, ws, msg: str):
         logger.error("Bitmex connection error: %s", msg)
 
     def _on_message(self, ws, msg: str):
 
-        data = json.loads(msg)
+        data = self._decode(msg)
+
+        if "subscribe" in data:
+            if data['subscribe'] in ["execution", "order"]:
+                self.user_stream_connected = data.get('success', False)
+
+        elif "error" in data:
+            logger.error("Bitmex websocket error: %s", data['error'])
 
         if "table" in data:
-            if data['table'] == "instrument":
+            if data['table'] in ["execution", "order"]:
+                self._on_order_update(data['data'])
+
+            elif data['table'] in ["instrument", "trade"]:
+                table = data['table']
+
+                # The snapshot sent when subscribing to a trade topic contains past trades, already in the candles
+                if table == "trade" and data.get('action') == "partial":
+                    return
 
                 for d in data['data']:
+                    if table == "trade" and d['symbol'] not in self.aggregators:
+                        continue
+
+                    self._dispatcher.submit(d['symbol'], (table, d))
+
+    def _process_market_data(self, updates: typing.List[typing.Tuple[str, typing.Dict]]):
+        """
+        Called by a worker thread of the dispatcher with the rows received for its symbols, oldest first.
+        Consecutive trades of a symbol are added to the candles together: they are collected until an instrument
+        update of the same symbol (or the end of the rows), so the order of the rows of each symbol is kept.
+        An error only loses the row (or the collected trades) where it happened.
+        :param updates: (table, row) of the instrument and trade tables
+        :return:
+        """
+
+        trades: typing.Dict[str, typing.Tuple[typing.List[float], typing.List[float], typing.List[int]]] = dict()
+
+        for table, d in updates:
+
+            symbol = d['symbol']
+
+            try:
+                if table == "instrument":
 
-                    symbol = d['symbol']
+                    if 'bidPrice' not in d and 'askPrice' not in d:
+                        continue
 
-                    if symbol not in self.prices:
-                        self.prices[symbol] = {'bid': None, 'ask': None}
+                    # The trades received before this update are processed first
+                    if symbol in trades:
+                        self._add_trades(symbol, *trades.pop(symbol))
 
-                    if 'bidPrice' in d:
-                        self.prices[symbol]['bid'] = d['bidPrice']
-                    if 'askPrice' in d:
-                        self.prices[symbol]['ask'] = d['askPrice']
+                    ts = bitmex_timestamp_to_ms(d['timestamp']) if 'timestamp' in d else None
+                    snapshot = self.prices.publish(symbol, d.get('bidPrice'), d.get('askPrice'), ts)
 
                     # PNL Calculation
 
-                    try:
-                        for b_index, strat in self.strategies.items():
-                            if strat.contract.symbol == symbol:
-                                for trade in strat.trades:
-                                    if trade.status == "open" and trade.entry_price is not None:
-
-                                        if trade.side == "long":
-                                            price = self.prices[symbol]['bid']
-                                        else:
-                                            price = self.prices[symbol]['ask']
-                                        multiplier = trade.contract.multiplier
-
-                                        if trade.contract.inverse:
-                                            if trade.side == "long":
-                                                trade.pnl = (
-                                                    1 / trade.entry_price - 1 / price) * multiplier * trade.quantity
-                                            elif trade.side == "short":
-                                                trade.pnl = (
-                                                    1 / price - 1 / trade.entry_price) * multiplier * trade.quantity
-                                        else:
-                                            if trade.side == "long":
-                                                trade.pnl = (
-                                                    price - trade.entry_price) * multiplier * trade.quantity
-                                            elif trade.side == "short":
-                                                trade.pnl = (
-                                                    trade.entry_price - price) * multiplier * trade.quantity
-                    except RuntimeError as e:
-                        logger.error(
-                            "Error while looping through the Bitmex strategies: %s", e)
-
-            if data['table'] == "trade":
+                    bid = snapshot.bid
+                    ask = snapshot.ask
 
-                for d in data['data']:
+                    for strat in self.symbol_strategies.get(symbol, tuple()):
+                        for trade in strat.trades:
+                            if trade.status == "open" and trade.entry_price is not None:
+
+                                if trade.side == "long":
+                                    price = bid
+                                else:
+                                    price = ask
+                                multiplier = trade.contract.multiplier
+
+                                if trade.contract.inverse:
+                                    if trade.side == "long":
+                                        pnl = (1 / trade.entry_price - 1 / price) * multiplier * trade.quantity
+                                    else:
+                                        pnl = (1 / price - 1 / trade.entry_price) * multiplier * trade.quantity
+                                else:
+                                    if trade.side == "long":
+                                        pnl = (price - trade.entry_price) * multiplier * trade.quantity
+                                    else:
+                                        pnl = (trade.entry_price - price) * multiplier * trade.quantity
+
+                                if pnl != trade.pnl:
+                                    trade.pnl = pnl
+                                    strat.trade_changed(trade)
+
+                elif table == "trade":
 
-                    symbol = d['symbol']
+                    price = float(d['price'])
+                    size = float(d['size'])
+                    timestamp = bitmex_timestamp_to_ms(d['timestamp'])
 
-                    ts = int(dateutil.parser.isoparse(
-                        d['timestamp']).timestamp() * 1000)
+                    if symbol not in trades:
+                        trades[symbol] = ([], [], [])
 
-                    for key, strat in self.strategies.items():
-                        if strat.contract.symbol == symbol:
-                            res = strat.parse_trades(
-                                float(d['price']), float(d['size']), ts)
-                            strat.check_trade(res)
+                    prices, sizes, timestamps = trades[symbol]
+                    prices.append(price)
+                    sizes.append(size)
+                    timestamps.append(timestamp)
 
-    def subscribe_channel(self, topic: str):
+            except Exception as e:
+                logger.error("Bitmex error while processing a %s row of %s: %s", table, symbol, e)
+
+        for symbol, (prices, sizes, timestamps) in trades.items():
+            self._add_trades(symbol, prices, sizes, timestamps)
+
+    def _add_trades(self, symbol: str, prices: typing.List[float], sizes: typing.List[float],
+                    timestamps: typing.List[int]):
+        """
+        Updates the candlesticks of the symbol and notifies the strategies.
+        :param symbol:
+        :param prices: Trades of the symbol, oldest first
+        :param sizes:
+        :param timestamps:
+        :return:
+        """
+
+        aggregator = self.aggregators.get(symbol)
+
+        if aggregator is None:
+            return
+
+        try:
+            aggregator.on_trades(prices, sizes, timestamps)
+        except Exception as e:
+            logger.error("Bitmex error while processing %s trades of %s: %s", len(prices), symbol, e)
+
+    def _on_order_update(self, rows: typing.List[typing.Dict]):
+        """
+        Merge the updates of the 'order' and 'execution' tables and send the order status to the strategy that
+        placed the order.
+        :param rows:
+        :return:
+        """
+
+        for row in rows:
+            order = self._orders.setdefault(row['orderID'], dict())
+            order.update(row)
+
+            if 'ordStatus' not in order or 'cumQty' not in order or 'avgPx' not in order:
+                continue
+
+            order_status = OrderStatus(order, "bitmex")
+
+            if order_status.status in FINAL_STATUSES:
+                del self._orders[row['orderID']]
+
+            self.order_tracker.on_update(order_status)
+
+    def _authenticate(self):
+        """
+        Authenticate the websocket connection with the API key, to subscribe to the account topics.
+        https://www.bitmex.com/app/wsAPI#Authentication
+        :return:
+        """
+
+        expires = int(time.time()) + 5
+        signature = hmac.new(self._secret_key.encode(), f"GET/realtime{expires}".encode(), hashlib.sha256).hexdigest()
+
+        data = dict()
+        data['op'] = "authKeyExpires"
+        data['args'] = [self._public_key, expires, signature]
+
+        try:
+            self.ws.send(json.dumps(data))
+        except Exception as e:
+            logger.error("Websocket error while authenticating: %s", e)
+
+    def set_watchlist(self, symbols: typing.Iterable[str]):
+        """
+        Symbols displayed in the Watchlist, their bid/ask prices are streamed. Called from the interface thread.
+        :param symbols:
+        :return:
+        """
+
+        watchlist = set(symbols)
+
+        if watchlist != self._watchlist:
+            self._watchlist = watchlist
+            self._sync_subscriptions()
+
+    def _sync_subscriptions(self):
+        """
+        Subscribe to the instrument (bid/ask) topic of the Watchlist and strategies symbols, to the trade topic of the
+        strategies symbols, and unsubscribe from the topics not needed anymore.
+        https://www.bitmex.com/app/wsAPI#Subscriptions
+        :return:
+        """
+
+        with self._topics_lock:
+            topics = {"instrument:" + symbol for symbol in self._watchlist | set(self.symbol_strategies)}
+            topics.update("trade:" + symbol for symbol in self.symbol_strategies)
+
+            if not self.ws_connected:  # Subscribed to when the connection opens
+                return
+
+            new_topics = sorted(topics - self._ws_topics)
+            old_topics = sorted(self._ws_topics - topics)
+
+            self._ws_topics = topics
+
+        if len(new_topics) > 0:
+            self.subscribe_channel(new_topics)
+        if len(old_topics) > 0:
+            self.unsubscribe_channel(old_topics)
+
+    def subscribe_channel(self, topics: typing.List[str]):
         data = dict()
         data['op'] = "subscribe"
-        data['args'] = []
-        data['args'].append(topic)
+        data['args'] = topics
+
+        try:
+            self.ws.send(json.dumps(data))
+            logger.info("Bitmex: subscribing to: %s", ','.join(topics))
+        except Exception as e:
+            logger.error(
+                "Websocket error while subscribing to %s: %s", topics, e)
+
+    def unsubscribe_channel(self, topics: typing.List[str]):
+        data = dict()
+        data['op'] = "unsubscribe"
+        data['args'] = topics
 
         try:
             self.ws.send(json.dumps(data))
+            logger.info("Bitmex: unsubscribing from: %s", ','.join(topics))
         except Exception as e:
             logger.error(
-                "Websocket error while subscribing to %s: %s", topic, e)
+                "Websocket error while unsubscribing from %s: %s", topics, e)
 
     def get_trade_size(self, contract: Contract, price: float, balance_pct: float):
         """
@@ -0,0 +1,30 @@
+import json
+import typing
+
+try:
+    import orjson  # Optional, several times faster than the json module to decode the websocket messages
+except ImportError:
+    orjson = None
+
+
+Decoder = typing.Callable[[typing.Union[str, bytes]], typing.Any]
+
+
+def get_decoder(name: typing.Optional[str] = None) -> Decoder:
+    """
+    Get the function used by the connectors to decode the JSON websocket messages.
+    :param name: orjson or json, None to use orjson if it is installed
+    :return:
+    """
+
+    if name is None:
+        name = "json" if orjson is None else "orjson"
+
+    if name == "orjson":
+        if orjson is None:
+            raise ValueError("orjson is not installed")
+        return orjson.loads
+    elif name == "json":
+        return json.loads
+    else:
+        raise ValueError(f"Unknown JSON decoder: {name}")
@@ -0,0 +1,80 @@
+import logging
+import typing
+import queue
+import threading
+import zlib
+
+
+logger = logging.getLogger()
+
+MARKET_DATA_WORKERS = 4
+MAX_BATCH = 500  # Maximum number of updates given to the handler at once
+
+
+class SymbolDispatcher:
+    """
+    Processes the market data updates on a pool of worker threads. The worker of an update is chosen by hashing its
+    symbol, so the updates of a symbol are always processed by the same worker, in the order they were received,
+    and a busy symbol only delays the symbols that share its worker.
+    A worker takes all the updates waiting in its queue (up to MAX_BATCH) and gives them to the handler together,
+    so that the trades received in a burst can be added to the candles at once.
+    """
+
+    def __init__(self, name: str, handler: typing.Callable[[typing.List[typing.Any]], None],
+                 workers: int = MARKET_DATA_WORKERS):
+        """
+        :param name: Used in the logs and the thread names, e.g: the exchange name
+        :param handler: Called from a worker thread with a list of updates, oldest first
+        :param workers: Number of worker threads
+        """
+
+        self.name = name
+        self._handler = handler
+
+        self._queues: typing.List["queue.Queue[typing.Any]"] = [queue.Queue() for _ in range(workers)]
+
+        for i, worker_queue in enumerate(self._queues):
+            t = threading.Thread(target=self._run, args=(worker_queue,), name=f"{name} market data {i}", daemon=True)
+            t.start()
+
+    def submit(self, symbol: str, update: typing.Any):
+        """
+        Called from the websocket threads.
+        :param symbol: The updates of a symbol are processed in order
+        :param update: Given as is to the handler
+        :return:
+        """
+
+        self._queues[zlib.crc32(symbol.encode()) % len(self._queues)].put(update)
+
+    def join(self):
+        """
+        Block until all the updates submitted so far have been processed.
+        """
+
+        for worker_queue in self._queues:
+            worker_queue.join()
+
+    def _run(self, worker_queue: "queue.Queue[typing.Any]"):
+        """
+        Infinite loop of a worker thread.
+        :param worker_queue:
+        :return:
+        """
+
+        while True:
+            updates = [worker_queue.get()]
+
+            while len(updates) < MAX_BATCH:
+                try:
+                    updates.append(worker_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._handler(updates)
+            except Exception as e:
+                logger.error("%s error while processing %s market data updates: %s", self.name, len(updates), e)
+
+            for _ in updates:
+                worker_queue.task_done()
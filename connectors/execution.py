@@ -0,0 +1,110 @@
+import logging
+import typing
+import time
+import queue
+import threading
+
+
+logger = logging.getLogger()
+
+SLOW_WAIT = 1.0  # Seconds, an order waiting longer in the queue is logged
+METRICS_INTERVAL = 600  # Seconds, the metrics are logged at most this often, after an order has been sent
+
+
+class ExecutionQueue:
+    """
+    Orders decided by the strategies (entries and exits), sent to the exchange one after the other by a worker
+    thread, so that the websocket threads only enqueue them and keep processing the market data while the REST
+    requests are made.
+    """
+
+    def __init__(self, name: str):
+        """
+        :param name: Used in the logs, e.g: the exchange name
+        """
+
+        self.name = name
+
+        self._queue: "queue.Queue[typing.Tuple[float, str, typing.Callable, typing.Optional[typing.Callable]]]" = \
+            queue.Queue()
+
+        # Time spent in the queue by the orders before being sent, in seconds
+        self.executed = 0
+        self.last_wait = 0.0
+        self.max_wait = 0.0
+        self._total_wait = 0.0
+        self._metrics_logged_at = time.time()
+
+        t = threading.Thread(target=self._run, daemon=True)
+        t.start()
+
+    @property
+    def depth(self) -> int:
+        """
+        :return: Number of orders waiting to be sent
+        """
+
+        return self._queue.qsize()
+
+    @property
+    def avg_wait(self) -> float:
+        return self._total_wait / self.executed if self.executed > 0 else 0.0
+
+    def metrics(self) -> typing.Dict[str, float]:
+        return {"depth": self.depth, "executed": self.executed, "last_wait": self.last_wait,
+                "avg_wait": self.avg_wait, "max_wait": self.max_wait}
+
+    def submit(self, description: str, func: typing.Callable, on_error: typing.Optional[typing.Callable] = None):
+        """
+        Queue an order, returns immediately.
+        :param description: Used in the logs
+        :param func: Sends the order and handles the response, called from the worker thread
+        :param on_error: Called if func raises an exception, e.g: to undo what was done when the order was queued
+        :return:
+        """
+
+        self._queue.put((time.time(), description, func, on_error))
+
+    def _run(self):
+        """
+        Infinite loop (runs in its own Thread) that sends the queued orders.
+        :return:
+        """
+
+        while True:
+            queued_at, description, func, on_error = self._queue.get()
+
+            wait = time.time() - queued_at
+
+            self.executed += 1
+            self.last_wait = wait
+            self.max_wait = max(self.max_wait, wait)
+            self._total_wait += wait
+
+            if wait > SLOW_WAIT:
+                logger.warning("%s: %s waited %.1f seconds before being sent (%s orders queued)",
+                               self.name, description, wait, self.depth)
+
+            try:
+                func()
+            except Exception as e:
+                logger.error("%s: error while sending %s: %s", self.name, description, e)
+
+                if on_error is not None:
+                    # The worker must survive, it is the only thread sending the orders of this connector
+                    try:
+                        on_error()
+                    except Exception as e:
+                        logger.error("%s: error while recovering from the failure of %s: %s", self.name, description, e)
+
+            if time.time() - self._metrics_logged_at > METRICS_INTERVAL:
+                self._log_metrics()
+
+    def _log_metrics(self):
+        metrics = self.metrics()
+
+        logger.info("%s: %s orders sent, %s queued, wait in the queue: last %.2fs, average %.2fs, max %.2fs",
+                    self.name, metrics['executed'], metrics['depth'], metrics['last_wait'], metrics['avg_wait'],
+                    metrics['max_wait'])
+
+        self._metrics_logged_at = time.time()
@@ -0,0 +1,23 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+
+POOL_SIZE = 10  # Maximum number of connections kept open to the exchange
+REQUEST_TIMEOUT = (3.05, 10)  # Seconds to establish the connection, seconds to wait for the response
+
+
+def create_session(pool_size: int = POOL_SIZE) -> requests.Session:
+    """
+    Create an HTTP session for the REST API of an exchange. The TCP + TLS connections are kept alive and reused
+    by the next requests, instead of paying a full handshake on every order or balance request.
+    :param pool_size: Maximum number of connections kept open, requests beyond it wait for a free connection
+    :return:
+    """
+
+    session = requests.Session()
+
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
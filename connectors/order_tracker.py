@@ -0,0 +1,131 @@
+import logging
+import typing
+import collections
+import threading
+
+from models import OrderStatus, Contract
+
+if typing.TYPE_CHECKING:
+    from strategies import Strategy
+    from connectors.bitmex import BitmexClient
+    from connectors.binance import BinanceClient
+
+
+logger = logging.getLogger()
+
+FINAL_STATUSES = ["filled", "canceled", "expired", "rejected"]
+
+MIN_POLL_INTERVAL = 1.0  # Seconds, used right after an order is placed
+MAX_POLL_INTERVAL = 16.0  # Seconds, reached when nothing changes, also used when the user data stream is connected
+
+
+class OrderTracker:
+    """
+    Routes the order updates received from the exchange to the strategy that placed the order, until the order
+    reaches a final status.
+    Updates normally come from the user data stream. While the stream is down, a single thread per connector
+    polls the status of all the pending orders in as few requests as the exchange allows, and waits longer
+    between polls when nothing changes.
+    """
+
+    def __init__(self, client: typing.Union["BitmexClient", "BinanceClient"], max_unclaimed: int = 200):
+        self._client = client
+
+        self._owners: typing.Dict[typing.Union[int, str], "Strategy"] = dict()
+
+        # Updates received before the strategy registered the order (the fill can arrive on the stream before
+        # place_order() returns), kept until claimed
+        self._unclaimed: typing.Dict[typing.Union[int, str], OrderStatus] = collections.OrderedDict()
+        self._max_unclaimed = max_unclaimed
+
+        self._lock = threading.Lock()
+
+        self._wake_up = threading.Event()
+        self._poll_interval = MIN_POLL_INTERVAL
+        self._poll_thread: typing.Optional[threading.Thread] = None
+
+    def track(self, order_id: typing.Union[int, str], strategy: "Strategy"):
+        """
+        Send the next updates of the order to the strategy.
+        """
+
+        with self._lock:
+            order_status = self._unclaimed.pop(order_id, None)
+            if order_status is None or order_status.status not in FINAL_STATUSES:
+                self._owners[order_id] = strategy
+
+            if self._poll_thread is None:
+                self._poll_thread = threading.Thread(target=self._poll_loop, daemon=True)
+                self._poll_thread.start()
+
+        if order_status is not None:
+            strategy.on_order_update(order_status)
+
+        # A new order is likely to be filled soon, poll again quickly
+        self._poll_interval = MIN_POLL_INTERVAL
+        self._wake_up.set()
+
+    def pending_orders(self) -> typing.Dict[typing.Union[int, str], Contract]:
+        with self._lock:
+            return {order_id: strategy.contract for order_id, strategy in self._owners.items()}
+
+    def on_update(self, order_status: OrderStatus) -> bool:
+        """
+        Called by the connectors when an order update is received.
+        :return: True if the update was sent to a strategy
+        """
+
+        with self._lock:
+            strategy = self._owners.get(order_status.order_id)
+
+            if strategy is None:
+                self._unclaimed[order_status.order_id] = order_status
+                while len(self._unclaimed) > self._max_unclaimed:
+                    self._unclaimed.popitem(last=False)
+                return False
+
+            if order_status.status in FINAL_STATUSES:
+                del self._owners[order_status.order_id]
+
+        strategy.on_order_update(order_status)
+
+        return True
+
+    def _poll_loop(self):
+        """
+        Infinite loop (runs in its own Thread) that replaces the Timer previously started for each pending order.
+        :return:
+        """
+
+        while True:
+            self._wake_up.wait(self._poll_interval)
+            self._wake_up.clear()
+
+            pending = self.pending_orders()
+
+            if len(pending) == 0:
+                self._poll_interval = MAX_POLL_INTERVAL
+                continue
+
+            if self._client.user_stream_connected and self._poll_interval < MAX_POLL_INTERVAL:
+                # The fills come from the stream, only check from time to time that none was missed
+                self._poll_interval = MAX_POLL_INTERVAL
+                continue
+
+            try:
+                statuses = self._client.get_orders_status(pending)
+            except Exception as e:
+                logger.error("Error while polling the status of %s orders: %s", len(pending), e)
+                statuses = []
+
+            changed = False
+
+            for order_status in statuses:
+                if order_status.status in FINAL_STATUSES or order_status.executed_qty:
+                    changed = True
+                self.on_update(order_status)
+
+            if changed:
+                self._poll_interval = MIN_POLL_INTERVAL
+            else:
+                self._poll_interval = min(self._poll_interval * 2, MAX_POLL_INTERVAL)
@@ -0,0 +1,76 @@
+import typing
+import time
+import itertools
+
+
+class PriceSnapshot(typing.NamedTuple):
+    bid: typing.Optional[float]
+    ask: typing.Optional[float]
+    ts: int  # Unix timestamp in milliseconds of the update
+    version: int  # Increases at every update of the board, whatever the symbol
+
+
+class PriceBoard:
+    """
+    Latest bid/ask of each symbol, written by the market data threads and read by the strategies and the interface.
+    Every update replaces the snapshot of the symbol by a new immutable one with the next version number, so readers
+    never see a bid of one update with the ask of another and don't need a lock: the slot is replaced in a single
+    dictionary assignment. A reader remembers the version it last used to know if the prices have changed since.
+    """
+
+    def __init__(self):
+        self._slots: typing.Dict[str, PriceSnapshot] = dict()
+        self._versions = itertools.count(1)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._slots
+
+    def get(self, symbol: str) -> typing.Optional[PriceSnapshot]:
+        return self._slots.get(symbol)
+
+    def publish(self, symbol: str, bid: typing.Optional[float] = None, ask: typing.Optional[float] = None,
+                ts: typing.Optional[int] = None) -> PriceSnapshot:
+        """
+        Only the market data thread of the symbol calls this method: the updates of a symbol must come from one thread
+        at a time, which the market data dispatcher guarantees. Other threads use publish_if_absent().
+        :param symbol:
+        :param bid: None keeps the previous bid, e.g: Bitmex updates only contain the fields that changed
+        :param ask: None keeps the previous ask
+        :param ts: Time of the update in milliseconds, the current time if not given by the exchange
+        :return: The new snapshot of the symbol
+        """
+
+        previous = self._slots.get(symbol)
+
+        if previous is not None:
+            if bid is None:
+                bid = previous.bid
+            if ask is None:
+                ask = previous.ask
+
+        if ts is None:
+            ts = int(time.time() * 1000)
+
+        snapshot = PriceSnapshot(bid, ask, ts, next(self._versions))
+        self._slots[symbol] = snapshot
+
+        return snapshot
+
+    def publish_if_absent(self, symbol: str, bid: float, ask: float,
+                          ts: typing.Optional[int] = None) -> PriceSnapshot:
+        """
+        Add a first snapshot for a symbol that has none yet, e.g: from a REST request of the interface thread while
+        the stream subscription is starting. Once the market data thread has published the symbol, its updates are
+        never overwritten by the (older) snapshot: the slot is only set if it is still empty, in a single
+        dict.setdefault() call.
+        :param symbol:
+        :param bid:
+        :param ask:
+        :param ts: Time of the snapshot in milliseconds, the current time if not given by the exchange
+        :return: The snapshot of the symbol, the one of the market data thread if it was first
+        """
+
+        if ts is None:
+            ts = int(time.time() * 1000)
+
+        return self._slots.setdefault(symbol, PriceSnapshot(bid, ask, ts, next(self._versions)))
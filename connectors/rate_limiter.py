@@ -0,0 +1,213 @@
+import logging
+import typing
+import time
+import queue
+import itertools
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, Future
+
+
+logger = logging.getLogger()
+
+# Request priorities, the lowest value is sent first
+PRIORITY_ORDER = 0  # Place and cancel orders
+PRIORITY_ACCOUNT = 1  # Order status, balances
+PRIORITY_MARKET = 2  # Exchange info, bid/ask snapshots
+PRIORITY_HISTORY = 3  # Historical candles backfill
+
+
+class RateBudget:
+    """
+    Cost (request weight, number of orders...) allowed by the exchange per time window, e.g: 1200 per minute.
+    The cost used is estimated locally when a request is sent, and corrected with the value reported by the
+    exchange in the response headers.
+    """
+
+    def __init__(self, limit: int, window: float, margin: float = 0.9):
+        """
+        :param limit: Maximum cost per window
+        :param window: Window duration in seconds, windows are aligned on multiples of it (like the exchanges)
+        :param margin: Fraction of the limit that can be used, the rest absorbs estimation errors
+        """
+
+        self.window = window
+        self._margin = margin
+        self.limit = limit
+
+        self._used = 0
+        self._reset_at = 0.0
+        self._blocked_until = 0.0
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @limit.setter
+    def limit(self, limit: int):
+        self._limit = limit
+        self._usable = max(1, int(limit * self._margin))
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    def _roll(self, now: float):
+        if now >= self._reset_at:
+            self._used = 0
+            self._reset_at = (now // self.window + 1) * self.window
+
+    def wait_time(self, cost: int, now: float) -> float:
+        """
+        :return: Seconds to wait before the cost fits in the budget, 0 if it can be sent now
+        """
+
+        if now < self._blocked_until:
+            return self._blocked_until - now
+
+        self._roll(now)
+
+        if self._used + cost <= self._usable or self._used == 0:
+            return 0.0
+
+        return self._reset_at - now
+
+    def consume(self, cost: int, now: float):
+        self._roll(now)
+        self._used += cost
+
+    def sync(self, used: int, reset_at: typing.Optional[float] = None):
+        """
+        Update the cost used in the current window with the value reported by the exchange.
+        Requests still in flight are not counted by the exchange yet, so the local estimate is kept if higher.
+        :param used:
+        :param reset_at: Unix timestamp of the end of the window, if the exchange gives it
+        :return:
+        """
+
+        if reset_at is not None and reset_at > self._reset_at:
+            self._used = used
+            self._reset_at = reset_at
+        else:
+            self._roll(time.time())
+            self._used = max(self._used, used)
+
+    def block(self, seconds: float):
+        """
+        Stop sending requests for a while, after a 429 (too many requests) or 418 (IP banned) response.
+        """
+
+        self._blocked_until = max(self._blocked_until, time.time() + seconds)
+
+
+class _ScheduledRequest:
+    def __init__(self, priority: int, sequence: int, costs: typing.Dict[str, int], func: typing.Callable,
+                 future: Future):
+        self.priority = priority
+        self.sequence = sequence
+        self.costs = costs
+        self.func = func
+        self.future = future
+        self.queued_at = time.time()
+
+    def __lt__(self, other: "_ScheduledRequest") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class RequestScheduler:
+    """
+    Sends the REST requests of a connector, the most urgent first, while keeping the cost used in each budget
+    just under the exchange limits instead of getting 429 errors and bans.
+    A dispatcher thread takes the requests by priority, waits until their cost fits in the budgets and hands them
+    to a small pool of threads that make the HTTP calls.
+    """
+
+    def __init__(self, budgets: typing.Dict[str, RateBudget], workers: int = 4):
+        """
+        :param budgets: e.g: {"weight": RateBudget(1200, 60), "orders": RateBudget(50, 10)}
+        :param workers: Maximum number of requests in flight
+        """
+
+        self.budgets = budgets
+
+        self._queue: "queue.PriorityQueue[_ScheduledRequest]" = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+        t = threading.Thread(target=self._dispatch_loop, daemon=True)
+        t.start()
+
+    def submit(self, priority: int, costs: typing.Dict[str, int], func: typing.Callable) -> Future:
+        """
+        Queue a request without waiting for its result.
+        :param priority: One of the PRIORITY_ constants
+        :param costs: Cost of the request in each budget, e.g: {"weight": 5}
+        :param func: Function that makes the HTTP request
+        :return:
+        """
+
+        future = Future()
+        self._queue.put(_ScheduledRequest(priority, next(self._sequence), costs, func, future))
+
+        return future
+
+    def call(self, priority: int, costs: typing.Dict[str, int], func: typing.Callable):
+        """
+        Queue a request and wait for its result.
+        """
+
+        return self.submit(priority, costs, func).result()
+
+    def block(self, seconds: float):
+        for budget in self.budgets.values():
+            budget.block(seconds)
+
+    def _wait_time(self, costs: typing.Dict[str, int]) -> float:
+        now = time.time()
+
+        with self._lock:
+            return max([self.budgets[name].wait_time(cost, now) for name, cost in costs.items()
+                        if name in self.budgets] + [0.0])
+
+    def _consume(self, costs: typing.Dict[str, int]):
+        now = time.time()
+
+        with self._lock:
+            for name, cost in costs.items():
+                if name in self.budgets:
+                    self.budgets[name].consume(cost, now)
+
+    def _dispatch_loop(self):
+        while True:
+            request = self._queue.get()
+
+            while True:
+                wait = self._wait_time(request.costs)
+                if wait <= 0:
+                    break
+
+                # A more urgent request may be queued while waiting for the budget to be available again
+                try:
+                    other = self._queue.get(timeout=min(wait, 0.1))
+                except queue.Empty:
+                    continue
+
+                if other < request:
+                    request, other = other, request
+                self._queue.put(other)
+
+            if request.priority != PRIORITY_HISTORY and time.time() - request.queued_at > 1:
+                logger.warning("Request delayed by %.1f seconds to stay under the rate limit",
+                               time.time() - request.queued_at)
+
+            self._consume(request.costs)
+            self._executor.submit(self._run, request)
+
+    @staticmethod
+    def _run(request: _ScheduledRequest):
+        try:
+            request.future.set_result(request.func())
+        except Exception as e:
+            request.future.set_exception(e)
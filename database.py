@@ -1,5 +1,53 @@
 import sqlite3
 import typing
+import json
+import time
+import queue
+import logging
+import threading
+
+import numpy as np
+
+from buffers import CandleSeries
+from models import Trade
+
+
+logger = logging.getLogger()
+
+JOURNAL_BATCH = 200  # Maximum number of trades or order events recorded in one transaction
+
+
+def write_batches(rows_queue: queue.Queue, conn: sqlite3.Connection, lock: threading.Lock, sql: str, what: str):
+    """
+    Infinite loop (runs in its own Thread) that records the rows queued for a journal, all the rows waiting in the
+    queue (up to JOURNAL_BATCH) in one transaction. task_done() is called for every row, written or not, so that
+    the flush() of the journal never blocks on a failed transaction.
+    :param rows_queue: Filled by the journal, read only by this thread
+    :param conn: Connection of the journal
+    :param lock: Lock of the connection, shared with the readers of the journal
+    :param sql: INSERT statement with one placeholder per column of the rows
+    :param what: Used in the logs, e.g: closed trades
+    :return:
+    """
+
+    while True:
+        rows = [rows_queue.get()]
+
+        while len(rows) < JOURNAL_BATCH:
+            try:
+                rows.append(rows_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            with lock:
+                conn.executemany(sql, rows)
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error("Error while recording %s %s: %s", len(rows), what, e)
+
+        for _ in rows:
+            rows_queue.task_done()
 
 
 class WorkspaceData:
@@ -26,6 +74,16 @@ class WorkspaceData:
 
         self.cursor.execute(f"DELETE FROM {table}")
 
+        self.add(table, data)
+
+    def add(self, table: str, data: typing.List[typing.Tuple]):
+        """
+        Record new data to the table, after the rows already saved.
+        :param table: The table name
+        :param data: A list of tuples, the tuples elements must be ordered like the table columns
+        :return:
+        """
+
         table_data = self.cursor.execute(f"SELECT * FROM {table}")
 
         # Lists the columns of the table
@@ -48,3 +106,225 @@ class WorkspaceData:
         data = self.cursor.fetchall()
 
         return data
+
+
+class CandleCache:
+    """
+    Historical candles saved on disk, so that starting a strategy only requests the candles created since the
+    last time its symbol and timeframe were loaded.
+    Shared by the interface thread and the connectors threads.
+    """
+
+    def __init__(self, path: str = "candles.db"):
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        with self._lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")  # Readers don't wait for the writers
+            self.conn.execute("CREATE TABLE IF NOT EXISTS candles (exchange TEXT, symbol TEXT, timeframe TEXT,"
+                              "ts INTEGER, open REAL, high REAL, low REAL, close REAL, volume REAL,"
+                              "PRIMARY KEY (exchange, symbol, timeframe, ts)) WITHOUT ROWID")
+            self.conn.commit()
+
+    def last_timestamp(self, exchange: str, symbol: str, timeframe: str) -> typing.Optional[int]:
+        """
+        :return: Open time of the most recent candle saved, None if there is none
+        """
+
+        with self._lock:
+            row = self.conn.execute("SELECT MAX(ts) FROM candles WHERE exchange = ? AND symbol = ? AND timeframe = ?",
+                                    (exchange, symbol, timeframe)).fetchone()
+
+        return row[0]
+
+    def get(self, exchange: str, symbol: str, timeframe: str, limit: int) -> CandleSeries:
+        """
+        :param limit: Number of candles, the most recent ones
+        :return: Oldest first
+        """
+
+        with self._lock:
+            rows = self.conn.execute("SELECT ts, open, high, low, close, volume FROM candles "
+                                     "WHERE exchange = ? AND symbol = ? AND timeframe = ? "
+                                     "ORDER BY ts DESC LIMIT ?", (exchange, symbol, timeframe, limit)).fetchall()
+
+        rows.reverse()
+
+        return CandleSeries(np.array([r[0] for r in rows], dtype=np.int64),
+                            *[np.array([r[i] for r in rows], dtype=np.float64) for i in range(1, 6)])
+
+    def save(self, exchange: str, symbol: str, timeframe: str, candles: CandleSeries):
+        """
+        Record new candles, the candles already saved with the same open time are replaced (e.g: the last candle
+        saved was not closed yet).
+        :return:
+        """
+
+        rows = zip([exchange] * len(candles.timestamp), [symbol] * len(candles.timestamp),
+                   [timeframe] * len(candles.timestamp), candles.timestamp.tolist(), candles.open.tolist(),
+                   candles.high.tolist(), candles.low.tolist(), candles.close.tolist(), candles.volume.tolist())
+
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.conn.commit()
+
+
+class TradeJournal:
+    """
+    Closed trades, moved out of the strategies so that the live data only contains the open ones.
+    Trades are queued by archive() and recorded by a background thread, several in one transaction when many trades
+    are closed at once. The interface reads the history page by page.
+    """
+
+    def __init__(self, path: str = "trades.db"):
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        # Makes the data retrieved from the database accessible by their column name
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+
+        self._queue: "queue.Queue[typing.Tuple]" = queue.Queue()
+        self._writer: typing.Optional[threading.Thread] = None
+
+        with self._lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")  # The interface reads while the connectors write
+            self.conn.execute("CREATE TABLE IF NOT EXISTS trades (time INTEGER, exchange TEXT, symbol TEXT,"
+                              "price_decimals INTEGER, strategy TEXT, side TEXT, entry_price REAL, quantity REAL,"
+                              "status TEXT, pnl REAL, entry_id TEXT, closed_at INTEGER)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS trades_time ON trades (time)")
+            self.conn.commit()
+
+            self._data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def archive(self, trade: Trade):
+        """
+        Queue a closed trade, returns immediately. Called from the execution threads of the connectors.
+        :param trade:
+        :return:
+        """
+
+        # The writer thread is only started by the instances that record trades
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=write_batches, daemon=True, args=(
+                    self._queue, self.conn, self._lock,
+                    "INSERT INTO trades VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", "closed trades"))
+                self._writer.start()
+
+        self._queue.put((trade.time, trade.contract.exchange, trade.contract.symbol, trade.contract.price_decimals,
+                         trade.strategy, trade.side, trade.entry_price, trade.quantity, trade.status, trade.pnl,
+                         str(trade.entry_id), int(time.time() * 1000)))
+
+    def flush(self):
+        """
+        Block until the trades queued so far are recorded, e.g: before the program exits.
+        """
+
+        self._queue.join()
+
+    def has_changed(self) -> bool:
+        """
+        :return: True if trades have been recorded by another connection since the previous call
+        """
+
+        with self._lock:
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+        changed = data_version != self._data_version
+        self._data_version = data_version
+
+        return changed
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+
+    def get_page(self, page: int, page_size: int) -> typing.List[sqlite3.Row]:
+        """
+        :param page: 0 for the most recent trades
+        :param page_size: Number of trades per page
+        :return: Most recent first
+        """
+
+        with self._lock:
+            return self.conn.execute("SELECT * FROM trades ORDER BY time DESC LIMIT ? OFFSET ?",
+                                     (page_size, page * page_size)).fetchall()
+
+
+class OrderJournal:
+    """
+    Append-only record of what the strategies do with their orders (entry intent, entry placed, fill, exit intent,
+    failed exit, close, cancel), so that the open trades can be rebuilt after the program stops. The events are
+    queued and recorded by a background thread, all the events waiting in the queue in one transaction, so the order
+    placement doesn't wait for the disk.
+    Events are grouped by strategy: (exchange, symbol, timeframe, strategy name).
+    """
+
+    def __init__(self, path: str = "orders.db"):
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+
+        self._queue: "queue.Queue[typing.Tuple]" = queue.Queue()
+
+        with self._lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")  # A commit doesn't wait for the WAL file to be synced
+            self.conn.execute("CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY AUTOINCREMENT, ts INTEGER,"
+                              "exchange TEXT, symbol TEXT, timeframe TEXT, strategy TEXT, event TEXT,"
+                              "trade_time INTEGER, data TEXT)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS events_strategy ON events "
+                              "(exchange, symbol, timeframe, strategy, seq)")
+            self.conn.commit()
+
+        t = threading.Thread(target=write_batches, daemon=True, args=(
+            self._queue, self.conn, self._lock, "INSERT INTO events (ts, exchange, symbol, timeframe, strategy, event, "
+                                                "trade_time, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", "order events"))
+        t.start()
+
+    def record(self, key: typing.Tuple[str, str, str, str], event: str, trade_time: typing.Optional[int] = None,
+               data: typing.Optional[typing.Dict] = None):
+        """
+        Queue an event, returns immediately.
+        :param key: (exchange, symbol, timeframe, strategy name)
+        :param event: entry, placed, fill, exit, exit_failed, close or cancel
+        :param trade_time: Identifies the trade concerned, None for the events before the trade exists
+        :param data: Saved as JSON
+        :return:
+        """
+
+        self._queue.put((int(time.time() * 1000), *key, event, trade_time, json.dumps(data or dict())))
+
+    def flush(self):
+        """
+        Block until the events queued so far are recorded.
+        """
+
+        self._queue.join()
+
+    def replay(self, key: typing.Tuple[str, str, str, str]) -> typing.List[typing.Dict]:
+        """
+        :param key: (exchange, symbol, timeframe, strategy name)
+        :return: The events of the strategy, oldest first, as dictionaries with the data decoded
+        """
+
+        self.flush()  # e.g: the same strategy was just stopped, its last events may still be queued
+
+        with self._lock:
+            rows = self.conn.execute("SELECT seq, ts, event, trade_time, data FROM events WHERE exchange = ? AND "
+                                     "symbol = ? AND timeframe = ? AND strategy = ? ORDER BY seq", key).fetchall()
+
+        return [{"seq": r['seq'], "ts": r['ts'], "event": r['event'], "trade_time": r['trade_time'],
+                 "data": json.loads(r['data'])} for r in rows]
+
+    def compact(self, key: typing.Tuple[str, str, str, str], keep_from: int):
+        """
+        Delete the events of a strategy that are not needed anymore to rebuild its open trades.
+        :param key: (exchange, symbol, timeframe, strategy name)
+        :param keep_from: Sequence number of the oldest event to keep
+        :return:
+        """
+
+        with self._lock:
+            self.conn.execute("DELETE FROM events WHERE exchange = ? AND symbol = ? AND timeframe = ? AND "
+                              "strategy = ? AND seq < ?", (*key, keep_from))
+            self.conn.commit()
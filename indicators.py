@@ -0,0 +1,98 @@
+import math
+import typing
+
+
+class Ema:
+    """
+    Exponential Moving Average updated one value at a time.
+    The weighting is the same as pandas .ewm(adjust=True).mean(), so after feeding the same values the result
+    matches the one computed on the full history, without keeping the history.
+    """
+
+    def __init__(self, alpha: float, min_periods: int = 0):
+        self._decay = 1 - alpha
+        self._min_periods = min_periods
+
+        self._weighted_sum = 0.0
+        self._weights_sum = 0.0
+
+        self.count = 0
+
+    @classmethod
+    def from_span(cls, span: int, min_periods: int = 0) -> "Ema":
+        return cls(2 / (span + 1), min_periods)
+
+    @classmethod
+    def from_com(cls, com: int, min_periods: int = 0) -> "Ema":
+        return cls(1 / (1 + com), min_periods)
+
+    def update(self, value: float) -> float:
+        self._weighted_sum = self._weighted_sum * self._decay + value
+        self._weights_sum = self._weights_sum * self._decay + 1
+        self.count += 1
+
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if self.count == 0 or self.count < self._min_periods:
+            return math.nan
+
+        return self._weighted_sum / self._weights_sum
+
+
+class MacdState:
+    """
+    Running MACD line and Signal line, updated once per closed candle.
+    """
+
+    def __init__(self, ema_fast: int, ema_slow: int, ema_signal: int):
+        self._ema_fast = Ema.from_span(ema_fast)
+        self._ema_slow = Ema.from_span(ema_slow)
+        self._ema_signal = Ema.from_span(ema_signal)
+
+        self.macd_line = math.nan
+        self.macd_signal = math.nan
+
+    def update(self, close: float) -> typing.Tuple[float, float]:
+        self.macd_line = self._ema_fast.update(close) - self._ema_slow.update(close)
+        self.macd_signal = self._ema_signal.update(self.macd_line)
+
+        return self.macd_line, self.macd_signal
+
+
+class RsiState:
+    """
+    Running Relative Strength Index with Wilder smoothing of the average gain and loss (com = length - 1),
+    updated once per closed candle.
+    """
+
+    def __init__(self, rsi_length: int):
+        self._avg_gain = Ema.from_com(rsi_length - 1, min_periods=rsi_length)
+        self._avg_loss = Ema.from_com(rsi_length - 1, min_periods=rsi_length)
+
+        self._prev_close = None
+
+        self.value = math.nan
+
+    def update(self, close: float) -> float:
+        if self._prev_close is None:
+            self._prev_close = close
+            return self.value
+
+        delta = close - self._prev_close
+        self._prev_close = close
+
+        avg_gain = self._avg_gain.update(delta if delta > 0 else 0.0)
+        avg_loss = self._avg_loss.update(-delta if delta < 0 else 0.0)
+
+        if math.isnan(avg_gain) or math.isnan(avg_loss):
+            self.value = math.nan
+        elif avg_loss == 0:
+            # Same as pandas: x / 0 gives an infinite Relative Strength (RSI = 100), 0 / 0 gives NaN
+            self.value = 100.0 if avg_gain > 0 else math.nan
+        else:
+            rs = avg_gain / avg_loss  # Relative Strength
+            self.value = round(100 - 100 / (1 + rs), 2)
+
+        return self.value
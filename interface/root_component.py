@@ -2,9 +2,13 @@ import tkinter as tk
 from tkinter.messagebox import askquestion
 import logging
 import json
+import time
+import typing
+import weakref
 
 from connectors.bitmex import BitmexClient
 from connectors.binance import BinanceClient
+from buffers import LogBuffer
 
 from interface.styling import *
 from interface.logging_component import Logging
@@ -16,6 +20,11 @@ from interface.strategy_component import StrategyEditor
 # This will be the same logger object as the one configured in main.py
 logger = logging.getLogger()
 
+# Interval between two refreshes of the interface, in milliseconds
+UI_MIN_INTERVAL = 500
+UI_MAX_INTERVAL = 3000
+UI_MAX_LOAD = 0.05  # Share of the interface thread time the refreshes may take, above it the interval grows
+
 
 class Root(tk.Tk):
     def __init__(self, binance: BinanceClient, bitmex: BitmexClient):
@@ -65,6 +74,14 @@ class Root(tk.Tk):
         self._trades_frame = TradesWatch(self._right_frame, bg=BG_COLOR)
         self._trades_frame.pack(side=tk.TOP, pady=15)
 
+        # (exchange, symbol, price version) last displayed on each row of the Watchlist
+        self._watchlist_versions = dict()
+
+        self._refresh_cost = 0.0  # Milliseconds, average duration of the interface refresh
+
+        # Number of the next log to display from each log buffer, forgotten with the buffer of a removed strategy
+        self._log_cursors: typing.MutableMapping[LogBuffer, int] = weakref.WeakKeyDictionary()
+
         self._update_ui()  # Starts the infinite interface update loop
 
     def _ask_before_close(self):
@@ -77,71 +94,77 @@ class Root(tk.Tk):
         result = askquestion(
             "Confirmation", "Do you really want to exit the application?")
         if result == "yes":
-            self.binance.reconnect = False  # Avoids the infinite reconnect loop in _start_ws()
-            self.bitmex.reconnect = False
-            self.binance.ws.close()
-            self.bitmex.ws.close()
+            self.binance.close()
+            self.bitmex.close()
 
             self.destroy()  # Destroys the UI and terminates the program as no other thread is running
 
     def _update_ui(self):
         """
-        Called by itself every 1500 seconds. It is similar to an infinite loop but runs within the same Thread
-        as .mainloop() thanks to the .after() method, thus it is "thread-safe" to update elements of the interface
-        in this method. Do not update Tkinter elements from another Thread like the websocket thread.
+        Called by itself, every UI_MIN_INTERVAL to UI_MAX_INTERVAL milliseconds depending on how long the refresh
+        takes. It is similar to an infinite loop but runs within the same Thread as .mainloop() thanks to the .after()
+        method, thus it is "thread-safe" to update elements of the interface in this method. Do not update Tkinter
+        elements from another Thread like the websocket thread.
         :return:
         """
 
-        # Logs
+        start = time.perf_counter()
 
-        for log in self.bitmex.logs:
-            if not log['displayed']:
-                self.logging_frame.add_log(log['log'])
-                log['displayed'] = True
+        self._refresh()
 
-        for log in self.binance.logs:
-            if not log['displayed']:
-                self.logging_frame.add_log(log['log'])
-                log['displayed'] = True
+        cost = (time.perf_counter() - start) * 1000
 
-        # Trades and Logs
+        # Smoothed, so that a single slow refresh (e.g: many new trades at once) doesn't change the interval much
+        self._refresh_cost = 0.8 * self._refresh_cost + 0.2 * cost
+        interval = int(min(UI_MAX_INTERVAL, max(UI_MIN_INTERVAL, self._refresh_cost / UI_MAX_LOAD)))
 
-        for client in [self.binance, self.bitmex]:
+        self.after(interval, self._update_ui)
 
-            try:  # try...except statement to handle the case when a dictionary is updated during the following loops
+    def _add_new_logs(self, logs: LogBuffer):
+        """
+        Display the logs added to the buffer since the previous refresh.
+        :param logs: Log buffer of a client or a strategy
+        :return:
+        """
 
-                for b_index, strat in client.strategies.items():
-                    for log in strat.logs:
-                        if not log['displayed']:
-                            self.logging_frame.add_log(log['log'])
-                            log['displayed'] = True
+        messages, self._log_cursors[logs] = logs.read(self._log_cursors.get(logs, 0))
 
-                    # Update the Trades component (add a new trade, change status/PNL)
+        for message in messages:
+            self.logging_frame.add_log(message)
 
-                    for trade in strat.trades:
-                        if trade.time not in self._trades_frame.body_widgets['symbol']:
-                            self._trades_frame.add_trade(trade)
+    def _refresh(self):
+        """
+        Display what has changed since the previous refresh: the new logs, the trades queued in the changed_trades of
+        their strategy, the trades recorded in the journal and the Watchlist prices with a new version.
+        :return:
+        """
 
-                        if "binance" in trade.contract.exchange:
-                            precision = trade.contract.price_decimals
-                        else:
-                            precision = 8  # The Bitmex PNL is always is BTC, thus 8 decimals
+        # Logs
 
-                        pnl_str = "{0:.{prec}f}".format(
-                            trade.pnl, prec=precision)
-                        self._trades_frame.body_widgets['pnl_var'][trade.time].set(
-                            pnl_str)
-                        self._trades_frame.body_widgets['status_var'][trade.time].set(
-                            trade.status.capitalize())
-                        self._trades_frame.body_widgets['quantity_var'][trade.time].set(
-                            trade.quantity)
+        self._add_new_logs(self.bitmex.logs)
+        self._add_new_logs(self.binance.logs)
 
-            except RuntimeError as e:
-                logger.error(
-                    "Error while looping through strategies dictionary: %s", e)
+        # Trades and Logs
+
+        for client in [self.binance, self.bitmex]:
+
+            # The dictionary is replaced, not modified, when a strategy is added or removed
+            for b_index, strat in client.strategies.items():
+                self._add_new_logs(strat.logs)
+
+                # Update the Trades component (add a new trade, change status/PNL)
+
+                while len(strat.changed_trades) > 0:
+                    trade = strat.changed_trades.popleft()
+                    trade.changed = False  # Before reading the trade, so a change made meanwhile queues it again
+                    self._trades_frame.update_trade(trade)
+
+        self._trades_frame.refresh_history()
 
         # Watchlist prices
 
+        bitmex_watchlist = []
+
         try:
             for key, value in self._watchlist_frame.body_widgets['symbol'].items():
 
@@ -154,7 +177,7 @@ class Root(tk.Tk):
                     if symbol not in self.binance.contracts:
                         continue
 
-                    if symbol not in self.binance.ws_subscriptions["bookTicker"] and self.binance.ws_connected:
+                    if symbol not in self.binance.ws_subscriptions["bookTicker"]:
                         self.binance.subscribe_channel(
                             [self.binance.contracts[symbol]], "bookTicker")
 
@@ -165,39 +188,47 @@ class Root(tk.Tk):
 
                     precision = self.binance.contracts[symbol].price_decimals
 
-                    prices = self.binance.prices[symbol]
+                    prices = self.binance.prices.get(symbol)
 
                 elif exchange == "Bitmex":
                     if symbol not in self.bitmex.contracts:
                         continue
 
+                    bitmex_watchlist.append(symbol)
+
                     if symbol not in self.bitmex.prices:
                         continue
 
                     precision = self.bitmex.contracts[symbol].price_decimals
 
-                    prices = self.bitmex.prices[symbol]
+                    prices = self.bitmex.prices.get(symbol)
 
                 else:
                     continue
 
-                if prices['bid'] is not None:
+                # Nothing to redraw if the prices haven't changed since the last refresh
+                if self._watchlist_versions.get(key) == (exchange, symbol, prices.version):
+                    continue
+                self._watchlist_versions[key] = (exchange, symbol, prices.version)
+
+                if prices.bid is not None:
                     price_str = "{0:.{prec}f}".format(
-                        prices['bid'], prec=precision)
+                        prices.bid, prec=precision)
                     self._watchlist_frame.body_widgets['bid_var'][key].set(
                         price_str)
-                if prices['ask'] is not None:
+                if prices.ask is not None:
                     price_str = "{0:.{prec}f}".format(
-                        prices['ask'], prec=precision)
+                        prices.ask, prec=precision)
                     self._watchlist_frame.body_widgets['ask_var'][key].set(
                         price_str)
 
+            # Streams the prices of the symbols added to the Watchlist, stops streaming the ones removed
+            self.bitmex.set_watchlist(bitmex_watchlist)
+
         except RuntimeError as e:
             logger.error(
                 "Error while looping through watchlist dictionary: %s", e)
 
-        self.after(1500, self._update_ui)
-
     def _save_workspace(self):
         """
         Collect the current data on the interface and saves it to the SQLite database to avoid setting up everything
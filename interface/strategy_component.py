@@ -315,25 +315,15 @@ class StrategyEditor(tk.Frame):
             else:
                 return
 
-            # Collects historical data. It is just one API call so that is ok, but be careful not to call methods
-            # that would lock the UI for too long.
+            # Collects historical data (unless another strategy already runs on the same symbol and timeframe):
+            # reads the local candle cache and requests the candles missing since the last run, in concurrent pages.
+            # The interface waits meanwhile, so be careful not to call methods that would lock the UI for too long.
             # For example don't make a query to a database containing billions of rows, your interface would freeze.
-            new_strategy.candles = self._exchanges[exchange].get_historical_candles(
-                contract, timeframe)
-
-            if len(new_strategy.candles) == 0:
+            if not self._exchanges[exchange].add_strategy(b_index, new_strategy):
                 self.root.logging_frame.add_log(
                     f"No historical data retrieved for {contract.symbol}")
                 return
 
-            if exchange == "Binance":
-                self._exchanges[exchange].subscribe_channel(
-                    [contract], "aggTrade")
-                self._exchanges[exchange].subscribe_channel(
-                    [contract], "bookTicker")
-
-            self._exchanges[exchange].strategies[b_index] = new_strategy
-
             for param in self._base_params:
                 code_name = param['code_name']
 
@@ -347,7 +337,7 @@ class StrategyEditor(tk.Frame):
                 f"{strat_selected} strategy on {symbol} / {timeframe} started")
 
         else:
-            del self._exchanges[exchange].strategies[b_index]
+            self._exchanges[exchange].remove_strategy(b_index)
 
             for param in self._base_params:
                 code_name = param['code_name']
@@ -1,12 +1,18 @@
 import tkinter as tk
 import typing
 import datetime
+import itertools
 
 from models import *
 
 from interface.styling import *
 from interface.scrollable_frame import ScrollableFrame
 
+from database import TradeJournal
+
+
+HISTORY_PAGE_SIZE = 10  # Number of closed trades displayed at once
+
 
 class TradesWatch(tk.Frame):
     def __init__(self, *args, **kwargs):
@@ -47,6 +53,45 @@ class TradesWatch(tk.Frame):
 
         self._body_index = 0
 
+        # Texts of the status, pnl and quantity variables of each trade, to only set the ones that changed
+        self._displayed: typing.Dict[int, typing.Dict[str, str]] = dict()
+
+        # Closed trades, read from the trade journal page by page
+
+        self.journal = TradeJournal()
+        self._history_page = 0
+
+        self._history_commands = tk.Frame(self, bg=BG_COLOR)
+        self._history_commands.pack(side=tk.TOP, pady=5)
+
+        self._newer_button = tk.Button(self._history_commands, text="<", font=GLOBAL_FONT, bg=BG_COLOR_2,
+                                       fg=FG_COLOR, command=lambda: self._show_history_page(self._history_page - 1))
+        self._newer_button.grid(row=0, column=0)
+
+        self._history_label = tk.Label(self._history_commands, text="", bg=BG_COLOR, fg=FG_COLOR, font=BOLD_FONT,
+                                       width=30)
+        self._history_label.grid(row=0, column=1)
+
+        self._older_button = tk.Button(self._history_commands, text=">", font=GLOBAL_FONT, bg=BG_COLOR_2,
+                                       fg=FG_COLOR, command=lambda: self._show_history_page(self._history_page + 1))
+        self._older_button.grid(row=0, column=2)
+
+        self._history_frame = tk.Frame(self, bg=BG_COLOR)
+        self._history_frame.pack(side=tk.TOP, anchor="nw")
+
+        # The labels are created once and their text replaced when another page is displayed
+        self._history_labels: typing.List[typing.Dict[str, tk.Label]] = []
+
+        for row in range(HISTORY_PAGE_SIZE):
+            labels = dict()
+            for idx, h in enumerate(self._headers):
+                labels[h] = tk.Label(self._history_frame, text="", bg=BG_COLOR, fg=FG_COLOR_2, font=GLOBAL_FONT,
+                                     width=self._col_width)
+                labels[h].grid(row=row, column=idx)
+            self._history_labels.append(labels)
+
+        self._show_history_page(0)
+
     def add_trade(self, trade: Trade):
         """
         Add a new trade row.
@@ -119,3 +164,98 @@ class TradesWatch(tk.Frame):
         self.body_widgets['pnl'][t_index].grid(row=b_index, column=7)
 
         self._body_index += 1
+
+    def remove_trade(self, t_index: int):
+        """
+        Remove the row of a trade.
+        :param t_index: Time of the trade
+        :return:
+        """
+
+        for h in self._headers:
+            self.body_widgets[h][t_index].destroy()
+            del self.body_widgets[h][t_index]
+
+            if h in ["status", "pnl", "quantity"]:
+                del self.body_widgets[h + "_var"][t_index]
+
+        self._displayed.pop(t_index, None)
+
+    def update_trade(self, trade: Trade):
+        """
+        Add the trade row if needed and update its quantity, status and PNL. Setting a Tk variable redraws its
+        label, so a variable is only set when its text has changed.
+        A closed trade is removed from the table, it is displayed in the history once recorded in the journal.
+        :param trade:
+        :return:
+        """
+
+        if trade.status == "closed":
+            if trade.time in self.body_widgets['symbol']:
+                self.remove_trade(trade.time)
+            return
+
+        if trade.time not in self.body_widgets['symbol']:
+            self.add_trade(trade)
+
+        if "binance" in trade.contract.exchange:
+            precision = trade.contract.price_decimals
+        else:
+            precision = 8  # The Bitmex PNL is always is BTC, thus 8 decimals
+
+        texts = {"pnl": "{0:.{prec}f}".format(trade.pnl, prec=precision), "status": trade.status.capitalize(),
+                 "quantity": str(trade.quantity)}
+
+        displayed = self._displayed.setdefault(trade.time, dict())
+
+        for h, text in texts.items():
+            if displayed.get(h) != text:
+                self.body_widgets[h + "_var"][trade.time].set(text)
+                displayed[h] = text
+
+    def refresh_history(self):
+        """
+        Called by the update_ui() method of the root component, reads the journal again only if trades have been
+        recorded since.
+        :return:
+        """
+
+        if self.journal.has_changed():
+            self._show_history_page(self._history_page)
+
+    def _show_history_page(self, page: int):
+        """
+        :param page: 0 for the most recent closed trades
+        :return:
+        """
+
+        count = self.journal.count()
+        pages = max(1, (count + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE)
+
+        self._history_page = min(max(page, 0), pages - 1)
+
+        rows = self.journal.get_page(self._history_page, HISTORY_PAGE_SIZE)
+
+        for labels, row in itertools.zip_longest(self._history_labels, rows):
+            if row is None:
+                for label in labels.values():
+                    label.configure(text="")
+                continue
+
+            if "binance" in row['exchange']:
+                precision = row['price_decimals']
+            else:
+                precision = 8  # The Bitmex PNL is always is BTC, thus 8 decimals
+
+            labels['time'].configure(text=datetime.datetime.fromtimestamp(row['time'] / 1000).strftime("%b %d %H:%M"))
+            labels['symbol'].configure(text=row['symbol'])
+            labels['exchange'].configure(text=row['exchange'].capitalize())
+            labels['strategy'].configure(text=row['strategy'])
+            labels['side'].configure(text=row['side'].capitalize())
+            labels['quantity'].configure(text=row['quantity'])
+            labels['status'].configure(text=row['status'].capitalize())
+            labels['pnl'].configure(text="{0:.{prec}f}".format(row['pnl'], prec=precision))
+
+        self._history_label.configure(text=f"History: page {self._history_page + 1}/{pages} ({count} trades)")
+        self._newer_button.configure(state=tk.NORMAL if self._history_page > 0 else tk.DISABLED)
+        self._older_button.configure(state=tk.NORMAL if self._history_page < pages - 1 else tk.DISABLED)
@@ -1,10 +1,38 @@
 import dateutil.parser
-import datetime
+import calendar
+import typing
 
 
 BITMEX_MULTIPLIER = 0.00000001  # Converts satoshi numbers to Bitcoin on Bitmex
 BITMEX_TF_MINUTES = {"1m": 1, "5m": 5, "1h": 60, "1d": 1440}
 
+_bitmex_days: typing.Dict[str, int] = dict()  # Unix timestamp in milliseconds of the dates already parsed
+
+
+def bitmex_timestamp_to_ms(timestamp: str) -> int:
+    """
+    Convert a Bitmex timestamp, always in UTC like 2021-06-06T12:34:56.789Z, to a Unix timestamp in milliseconds.
+    The fields are read at fixed positions and the conversion of the date is cached, since the trades of a day all
+    share it. Other formats go through dateutil.
+    :param timestamp:
+    :return:
+    """
+
+    if len(timestamp) != 24 or timestamp[-1] != "Z":
+        return int(round(dateutil.parser.isoparse(timestamp).timestamp() * 1000))
+
+    day = timestamp[:10]
+    day_ms = _bitmex_days.get(day)
+
+    if day_ms is None:
+        if len(_bitmex_days) > 1000:  # Only historical data spans many days
+            _bitmex_days.clear()
+        day_ms = calendar.timegm((int(day[:4]), int(day[5:7]), int(day[8:10]), 0, 0, 0)) * 1000
+        _bitmex_days[day] = day_ms
+
+    return day_ms + int(timestamp[11:13]) * 3600000 + int(timestamp[14:16]) * 60000 + \
+        int(timestamp[17:19]) * 1000 + int(timestamp[20:23])
+
 
 class Balance:
     def __init__(self, info, exchange):
@@ -38,10 +66,9 @@ class Candle:
             self.volume = float(candle_info[5])
 
         elif exchange == "bitmex":
-            self.timestamp = dateutil.parser.isoparse(candle_info['timestamp'])
-            self.timestamp = self.timestamp - \
-                datetime.timedelta(minutes=BITMEX_TF_MINUTES[timeframe])
-            self.timestamp = int(self.timestamp.timestamp() * 1000)
+            # The timestamp of a Bitmex candle is its close time
+            self.timestamp = bitmex_timestamp_to_ms(candle_info['timestamp']) - \
+                BITMEX_TF_MINUTES[timeframe] * 60000
             self.open = candle_info['open']
             self.high = candle_info['high']
             self.low = candle_info['low']
@@ -148,3 +175,5 @@ class Trade:
         self.pnl: float = trade_info['pnl']
         self.quantity = trade_info['quantity']
         self.entry_id = trade_info['entry_id']
+
+        self.changed = False  # Waiting in the changed_trades queue of its strategy to be refreshed on the interface
@@ -0,0 +1,152 @@
+import logging
+import typing
+import itertools
+import json
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from buffers import CandleSeries
+from backtester import run_backtest
+
+if typing.TYPE_CHECKING:
+    from database import WorkspaceData
+
+
+logger = logging.getLogger()
+
+# (exchange, symbol, timeframe), e.g: ("Binance", "BTCUSDT", "1h"). The exchange is written like in the interface.
+DatasetKey = typing.Tuple[str, str, str]
+
+# Candles attached to the shared memory blocks, in each worker process
+_worker_candles: typing.Dict[DatasetKey, CandleSeries] = dict()
+_worker_blocks: typing.List[shared_memory.SharedMemory] = []
+
+
+def _series_views(buffer, length: int) -> CandleSeries:
+    """
+    Column views on a block of 6 * length 8-byte values: the int64 timestamps followed by the float64 OHLCV columns.
+    """
+
+    timestamp = np.ndarray((length,), dtype=np.int64, buffer=buffer)
+    columns = np.ndarray((5, length), dtype=np.float64, buffer=buffer, offset=length * 8)
+
+    return CandleSeries(timestamp, columns[0], columns[1], columns[2], columns[3], columns[4])
+
+
+def _share_candles(candles: CandleSeries) -> shared_memory.SharedMemory:
+    length = len(candles.timestamp)
+    block = shared_memory.SharedMemory(create=True, size=max(1, 6 * length * 8))
+
+    views = _series_views(block.buf, length)
+    for view, column in zip(views, candles):
+        view[:] = column
+
+    return block
+
+
+def _init_worker(blocks: typing.Dict[DatasetKey, typing.Tuple[str, int]]):
+    """
+    Attach each worker to the shared candles once, instead of pickling the arrays with every task.
+    """
+
+    for key, (name, length) in blocks.items():
+        # The pool processes share the resource tracker of the parent, which unlinks the blocks at the end
+        block = shared_memory.SharedMemory(name=name)
+
+        _worker_blocks.append(block)
+        _worker_candles[key] = _series_views(block.buf, length)
+
+
+def _evaluate(task: typing.Tuple) -> typing.Dict:
+    key, strategy_type, take_profit, stop_loss, extra_params, allow_short = task
+
+    result = run_backtest(strategy_type, _worker_candles[key], take_profit, stop_loss, extra_params, allow_short)
+
+    return {"strategy_type": strategy_type, "exchange": key[0], "symbol": key[1], "timeframe": key[2],
+            "take_profit": take_profit, "stop_loss": stop_loss, "extra_params": extra_params,
+            "pnl": result.pnl, "max_drawdown": result.max_drawdown, "win_rate": result.win_rate,
+            "exposure": result.exposure, "trades": len(result.trades)}
+
+
+def optimize(strategy_type: str, datasets: typing.Dict[DatasetKey, CandleSeries],
+             param_grid: typing.Dict[str, typing.List], take_profit: typing.Optional[float] = None,
+             stop_loss: typing.Optional[float] = None, allow_short: bool = True,
+             processes: typing.Optional[int] = None, sort_by: str = "pnl") -> typing.List[typing.Dict]:
+    """
+    Backtest every combination of parameters on every dataset, spread over a pool of processes.
+    :param strategy_type: Technical or Breakout
+    :param datasets: Historical candles for each (exchange, symbol, timeframe)
+    :param param_grid: Values to try for each parameter, e.g: {"ema_fast": [8, 12], "ema_slow": [26, 30], ...}.
+    'take_profit' and 'stop_loss' can be part of the grid, otherwise the fixed values are used.
+    :param take_profit: In %
+    :param stop_loss: In %
+    :param allow_short: False for Binance Spot
+    :param processes: Number of worker processes, all the CPU cores by default
+    :param sort_by: Result key used for the ranking (highest first), e.g: pnl, win_rate
+    :return: One dictionary per (dataset, parameters) combination, best first
+    """
+
+    grid = dict(param_grid)
+    take_profits = grid.pop("take_profit", [take_profit])
+    stop_losses = grid.pop("stop_loss", [stop_loss])
+
+    param_names = list(grid.keys())
+
+    tasks = []
+    for key in datasets:
+        for tp, sl, values in itertools.product(take_profits, stop_losses, itertools.product(*grid.values())):
+            tasks.append((key, strategy_type, tp, sl, dict(zip(param_names, values)), allow_short))
+
+    if len(tasks) == 0:
+        return []
+
+    blocks = {key: _share_candles(candles) for key, candles in datasets.items()}
+
+    try:
+        block_info = {key: (block.name, len(datasets[key].timestamp)) for key, block in blocks.items()}
+        processes = processes or os.cpu_count() or 1
+
+        logger.info("Optimizing %s on %s datasets: %s backtests over %s processes",
+                    strategy_type, len(datasets), len(tasks), processes)
+
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(block_info,)) as pool:
+            chunksize = max(1, len(tasks) // (processes * 4))
+            results = list(pool.map(_evaluate, tasks, chunksize=chunksize))
+    finally:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+
+    results.sort(key=lambda r: r[sort_by], reverse=True)
+
+    return results
+
+
+def to_workspace_rows(results: typing.List[typing.Dict], balance_pct: float) -> typing.List[typing.Tuple]:
+    """
+    Convert optimization results to rows of the 'strategies' table, ordered like its columns, so that they
+    are loaded in the strategy component at the next start.
+    :param results: Results of optimize(), usually only the best ones
+    :param balance_pct: Balance % to use for the strategies (not part of the optimization)
+    :return:
+    """
+
+    rows = []
+
+    for r in results:
+        rows.append((r['strategy_type'], r['symbol'] + "_" + r['exchange'].capitalize(), r['timeframe'], balance_pct,
+                     r['take_profit'], r['stop_loss'], json.dumps(r['extra_params']),))
+
+    return rows
+
+
+def save_to_workspace(db: "WorkspaceData", results: typing.List[typing.Dict], balance_pct: float, top: int = 5):
+    """
+    Add the best results to the strategies saved in the workspace, without erasing the existing ones.
+    """
+
+    db.add("strategies", to_workspace_rows(results[:top], balance_pct))
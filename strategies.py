@@ -1,12 +1,15 @@
 import logging
 from typing import *
 import time
-
-from threading import Timer
-
-import pandas as pd
+import bisect
+import itertools
+import collections
+import json
+import threading
 
 from models import *
+from indicators import MacdState, RsiState
+from buffers import CandleBuffer, LogBuffer
 
 # Import the connector class names only for typing purpose (the classes aren't actually imported)
 if TYPE_CHECKING:
@@ -15,14 +18,103 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger()
 
-# TF_EQUIV is used in parse_trades() to compare the last candle timestamp to the new trade timestamp
+# TF_EQUIV is used by the CandleAggregator to compare the last candle timestamp to the new trade timestamp
 TF_EQUIV = {"1m": 60, "5m": 300, "15m": 900,
             "30m": 1800, "1h": 3600, "4h": 14400}
 
 
+class TriggerBook:
+    """
+    Take profit and Stop loss prices of the open trades, kept sorted so that a new price is only compared to the
+    nearest trigger on each side. Trades are added when their entry is filled and removed when they are closed.
+    """
+
+    def __init__(self):
+        # (price, sequence, trade, reason) tuples sorted by price, the sequence number keeps the tuples comparable
+        self._above = []  # Triggered when the price goes up to the trigger price: Long TP, Short SL
+        self._below = []  # Triggered when the price goes down to the trigger price: Long SL, Short TP
+        self._sequence = itertools.count()
+
+        # Writers come from the execution, user data and market data threads, the readers don't take it
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._above) + len(self._below)
+
+    def add(self, trade: Trade, tp_price: Optional[float], sl_price: Optional[float]):
+        """
+        Called from the order execution and user data threads. The lists are replaced instead of being modified in
+        place while the market data threads may loop through them, and the writers take the lock so that two
+        replacements made at the same time don't lose one of the changes.
+        """
+
+        above, below = (tp_price, sl_price) if trade.side == "long" else (sl_price, tp_price)
+
+        with self._lock:
+            if above is not None:
+                triggers = list(self._above)
+                bisect.insort(triggers, (above, next(self._sequence), trade,
+                                         "take_profit" if trade.side == "long" else "stop_loss"))
+                self._above = triggers
+            if below is not None:
+                triggers = list(self._below)
+                bisect.insort(triggers, (below, next(self._sequence), trade,
+                                         "stop_loss" if trade.side == "long" else "take_profit"))
+                self._below = triggers
+
+    def remove(self, trade: Trade):
+        """
+        Called from the market data threads when the exit order of a trade is queued.
+        """
+
+        with self._lock:
+            self._above = [t for t in self._above if t[2] is not trade]
+            self._below = [t for t in self._below if t[2] is not trade]
+
+    def triggered(self, price: float) -> List[Tuple[Trade, str]]:
+        """
+        :param price: Last trade price
+        :return: The trades whose Take profit or Stop loss is reached, with the reason (take_profit or stop_loss)
+        """
+
+        return self.triggered_between(price, price)
+
+    def triggered_between(self, low: float, high: float) -> List[Tuple[Trade, str]]:
+        """
+        Same as triggered() for all the prices between low and high. The order of the prices is lost here, so it is only
+        a pre-check of the range: on_trades() then calls triggered() for each price in order, to close a trade for the
+        limit its price reached first. A trade with both limits within the range is returned once (as stop_loss).
+        :param low: Lowest trade price
+        :param high: Highest trade price
+        :return:
+        """
+
+        above = self._above
+        below = self._below
+
+        if (len(above) == 0 or high < above[0][0]) and (len(below) == 0 or low > below[-1][0]):
+            return []
+
+        hits = dict()
+
+        for trigger_price, _, trade, reason in above:
+            if high < trigger_price:
+                break
+            hits[id(trade)] = (trade, reason)
+
+        for trigger_price, _, trade, reason in reversed(below):
+            if low > trigger_price:
+                break
+            if reason == "stop_loss" or id(trade) not in hits:
+                hits[id(trade)] = (trade, reason)
+
+        return list(hits.values())
+
+
 class Strategy:
     def __init__(self, client: Union["BitmexClient", "BinanceClient"], contract: Contract, exchange: str,
-                 timeframe: str, balance_pct: float, take_profit: float, stop_loss: float, strat_name):
+                 timeframe: str, balance_pct: float, take_profit: float, stop_loss: float, strat_name,
+                 other_params: Optional[Dict] = None):
 
         self.client = client
 
@@ -38,122 +130,125 @@ class Strategy:
 
         self.ongoing_position = False
 
-        self.candles: List[Candle] = []
+        self.candles = CandleBuffer()
+        # Open trades only, the closed ones are moved to the trade journal of the client.
+        # Replaced by a new list when a trade is removed, so the websocket threads can loop through it.
         self.trades: List[Trade] = []
-        self.logs = []
+        self.logs = LogBuffer()
+
+        # Trades created or modified since the interface last displayed them, each trade at most once
+        self.changed_trades: Deque[Trade] = collections.deque()
+
+        self._triggers = TriggerBook()
+
+        # Identifies the events of the strategy in the order journal of the client. The parameters are part of it, so
+        # that two strategies of the same type on the same symbol and timeframe don't restore each other's trades
+        params = {"balance_pct": balance_pct, "take_profit": take_profit, "stop_loss": stop_loss}
+        params.update(other_params or dict())
+        self.journal_key = (client.platform, contract.symbol, timeframe,
+                            f"{strat_name} {json.dumps(params, sort_keys=True)}")
 
     def _add_log(self, msg: str):
         logger.info("%s", msg)
-        self.logs.append({"log": msg, "displayed": False})
+        self.logs.append(msg)
 
-    def parse_trades(self, price: float, size: float, timestamp: int) -> str:
+    def trade_changed(self, trade: Trade):
         """
-        Parse new trades coming in from the websocket and update the Candle list based on the timestamp.
-        :param price: The trade price
-        :param size: The trade size
-        :param timestamp: Unix timestamp in milliseconds
+        Called from any thread after the price, quantity, status or PNL of a trade has been modified.
+        The interface sets trade.changed back to False before reading the trade, so a modification made meanwhile
+        queues it again.
+        :param trade:
         :return:
         """
 
-        timestamp_diff = int(time.time() * 1000) - timestamp
-        if timestamp_diff >= 2000:
-            logger.warning("%s %s: %s milliseconds of difference between the current time and the trade time",
-                           self.exchange, self.contract.symbol, timestamp_diff)
-
-        last_candle = self.candles[-1]
+        if not trade.changed:
+            trade.changed = True
+            self.changed_trades.append(trade)
 
-        # Same Candle
+    def set_candles(self, candles: CandleBuffer):
+        """
+        Set the candles of the strategy timeframe, built by the CandleAggregator of the symbol and shared with the
+        other strategies running on the same symbol and timeframe.
+        :param candles: The last one is the current (not closed yet) candle
+        :return:
+        """
 
-        if timestamp < last_candle.timestamp + self.tf_equiv:
+        self.candles = candles
 
-            last_candle.close = price
-            last_candle.volume += size
+    def on_candle_update(self, tick_type: str):
+        """
+        Called by the CandleAggregator after each trade, once the candles have been updated.
+        :param tick_type: same_candle or new_candle
+        :return:
+        """
 
-            if price > last_candle.high:
-                last_candle.high = price
-            elif price < last_candle.low:
-                last_candle.low = price
+        if tick_type == "same_candle" and len(self._triggers) > 0:
 
             # Check Take profit / Stop loss
 
-            for trade in self.trades:
-                if trade.status == "open" and trade.entry_price is not None:
-                    self._check_tp_sl(trade)
+            for trade, reason in self._triggers.triggered(self.candles.last_close):
+                self._close_position(trade, reason)
 
-            return "same_candle"
+        self.check_trade(tick_type)
 
-        # Missing Candle(s)
-
-        elif timestamp >= last_candle.timestamp + 2 * self.tf_equiv:
-
-            missing_candles = int(
-                (timestamp - last_candle.timestamp) / self.tf_equiv) - 1
-
-            logger.info("%s missing %s candles for %s %s (%s %s)", self.exchange, missing_candles, self.contract.symbol,
-                        self.tf, timestamp, last_candle.timestamp)
-
-            for missing in range(missing_candles):
-                new_ts = last_candle.timestamp + self.tf_equiv
-                candle_info = {'ts': new_ts, 'open': last_candle.close, 'high': last_candle.close,
-                               'low': last_candle.close, 'close': last_candle.close, 'volume': 0}
-                new_candle = Candle(candle_info, self.tf, "parse_trade")
-
-                self.candles.append(new_candle)
-
-                last_candle = new_candle
-
-            new_ts = last_candle.timestamp + self.tf_equiv
-            candle_info = {'ts': new_ts, 'open': price, 'high': price,
-                           'low': price, 'close': price, 'volume': size}
-            new_candle = Candle(candle_info, self.tf, "parse_trade")
+    def on_trades(self, prices: List[float], sizes: List[float]):
+        """
+        Called by the CandleAggregator after several trades of the current candle have been added at once
+        (e.g: one Bitmex message), instead of on_candle_update("same_candle") for each of them.
+        :param prices: Trade prices, in the order of the trades
+        :param sizes: Trade sizes
+        :return:
+        """
 
-            self.candles.append(new_candle)
+        if len(self._triggers) > 0 and len(self._triggers.triggered_between(min(prices), max(prices))) > 0:
 
-            return "new_candle"
+            # Some Take profit / Stop loss are within the range of the prices: the prices are checked in order, so
+            # that a trade is closed for the limit its price reached first, like with one trade at a time
 
-        # New Candle
+            for price in prices:
+                for trade, reason in self._triggers.triggered(price):
+                    self._close_position(trade, reason)
 
-        elif timestamp >= last_candle.timestamp + self.tf_equiv:
-            new_ts = last_candle.timestamp + self.tf_equiv
-            candle_info = {'ts': new_ts, 'open': price, 'high': price,
-                           'low': price, 'close': price, 'volume': size}
-            new_candle = Candle(candle_info, self.tf, "parse_trade")
+                if len(self._triggers) == 0:
+                    break
 
-            self.candles.append(new_candle)
+        self.check_trades(prices, sizes)
 
-            logger.info("%s New candle for %s %s", self.exchange,
-                        self.contract.symbol, self.tf)
+    def check_trades(self, prices: List[float], sizes: List[float]):
+        """
+        Check the signal once for several trades of the current candle. Strategies whose signal depends on every
+        intermediate price override it.
+        """
 
-            return "new_candle"
+        self.check_trade("same_candle")
 
-    def _check_order_status(self, order_id):
+    def on_order_update(self, order_status: OrderStatus):
         """
-        Called regularly after an order has been placed, until it is filled.
-        :param order_id: The order id to check.
+        Called when the status of an entry order is received, from the user data stream of the exchange or
+        from the REST API.
+        :param order_status:
         :return:
         """
 
-        order_status = self.client.get_order_status(self.contract, order_id)
-
-        if order_status is not None:
-
-            logger.info("%s order status: %s",
-                        self.exchange, order_status.status)
+        logger.info("%s order status: %s",
+                    self.exchange, order_status.status)
 
-            if order_status.status == "filled":
-                for trade in self.trades:
-                    if trade.entry_id == order_id:
+        if order_status.status == "filled":
+            for trade in self.trades:
+                if trade.entry_id == order_status.order_id:
+                    if trade.entry_price is None:  # The fill may be received from both the stream and the REST API
                         trade.entry_price = order_status.avg_price
                         trade.quantity = order_status.executed_qty
-                        break
-                return
-
-        t = Timer(2.0, lambda: self._check_order_status(order_id))
-        t.start()
+                        self._record("fill", trade, {"entry_price": trade.entry_price, "quantity": trade.quantity})
+                        self.trade_changed(trade)
+                        self._arm_tp_sl(trade)
+                    break
 
     def _open_position(self, signal_result: int):
         """
-        Open Long or Short position based on the signal result.
+        Open Long or Short position based on the signal result. The order is sent by the execution thread of the
+        connector, the position is considered ongoing as soon as the order is queued so that the next trades don't
+        trigger another entry.
         :param signal_result: 1 (Long) or -1 (Short)
         :return:
         """
@@ -162,9 +257,31 @@ class Strategy:
         if self.client.platform == "binance_spot" and signal_result == -1:
             return
 
+        self.ongoing_position = True
+        self._record("entry", data={"signal": signal_result})
+
+        price = self.candles.last_close
+
+        self.client.execution.submit(f"{self.strat_name} entry order on {self.contract.symbol} {self.tf}",
+                                     lambda: self._send_entry_order(signal_result, price),
+                                     on_error=self._cancel_entry)
+
+    def _cancel_entry(self):
+        self.ongoing_position = False
+        self._record("cancel")
+
+    def _send_entry_order(self, signal_result: int, price: float):
+        """
+        Called from the execution thread of the connector.
+        :param signal_result: 1 (Long) or -1 (Short)
+        :param price: Last price when the signal was triggered, used to compute the trade size
+        :return:
+        """
+
         trade_size = self.client.get_trade_size(
-            self.contract, self.candles[-1].close, self.balance_pct)
+            self.contract, price, self.balance_pct)
         if trade_size is None:
+            self._cancel_entry()
             return
 
         order_side = "buy" if signal_result == 1 else "sell"
@@ -180,80 +297,231 @@ class Strategy:
             self._add_log(
                 f"{order_side.capitalize()} order placed on {self.exchange} | Status: {order_status.status}")
 
-            self.ongoing_position = True
-
             avg_fill_price = None
 
             if order_status.status == "filled":
                 avg_fill_price = order_status.avg_price
-            else:
-                t = Timer(2.0, lambda: self._check_order_status(
-                    order_status.order_id))
-                t.start()
 
             new_trade = Trade({"time": int(time.time() * 1000), "entry_price": avg_fill_price,
                                "contract": self.contract, "strategy": self.strat_name, "side": position_side,
                                "status": "open", "pnl": 0, "quantity": order_status.executed_qty, "entry_id": order_status.order_id})
             self.trades.append(new_trade)
+            self._record("placed", new_trade, {"side": new_trade.side, "entry_price": new_trade.entry_price,
+                                               "quantity": new_trade.quantity, "entry_id": new_trade.entry_id})
+            self.trade_changed(new_trade)
 
-    def _check_tp_sl(self, trade: Trade):
+            if avg_fill_price is not None:
+                self._arm_tp_sl(new_trade)
+            else:
+                # The fill is sent by the user data stream, or polled by the order tracker when the stream is down
+                self.client.order_tracker.track(order_status.order_id, self)
+        else:
+            self._cancel_entry()
+
+    def _arm_tp_sl(self, trade: Trade):
         """
-        Based on the average entry price, calculates whether the defined stop loss or take profit has been reached.
+        Based on the average entry price, calculates the prices at which the defined stop loss or take profit
+        will be reached. Called once, when the entry order is filled.
         :param trade:
         :return:
         """
 
-        tp_triggered = False
-        sl_triggered = False
-
-        price = self.candles[-1].close
+        tp_price = None
+        sl_price = None
 
         if trade.side == "long":
             if self.stop_loss is not None:
-                if price <= trade.entry_price * (1 - self.stop_loss / 100):
-                    sl_triggered = True
+                sl_price = trade.entry_price * (1 - self.stop_loss / 100)
             if self.take_profit is not None:
-                if price >= trade.entry_price * (1 + self.take_profit / 100):
-                    tp_triggered = True
+                tp_price = trade.entry_price * (1 + self.take_profit / 100)
 
         elif trade.side == "short":
             if self.stop_loss is not None:
-                if price >= trade.entry_price * (1 + self.stop_loss / 100):
-                    sl_triggered = True
+                sl_price = trade.entry_price * (1 + self.stop_loss / 100)
             if self.take_profit is not None:
-                if price <= trade.entry_price * (1 - self.take_profit / 100):
-                    tp_triggered = True
+                tp_price = trade.entry_price * (1 - self.take_profit / 100)
 
-        if tp_triggered or sl_triggered:
+        self._triggers.add(trade, tp_price, sl_price)
 
-            self._add_log(f"{'Stop loss' if sl_triggered else 'Take profit'} for {self.contract.symbol} {self.tf} "
-                          f"| Current Price = {price} (Entry price was {trade.entry_price})")
+    def _close_position(self, trade: Trade, reason: str):
+        """
+        Queue the exit order of a trade whose stop loss or take profit has been reached. The triggers of the trade
+        are removed meanwhile, so that the following trades don't queue another exit.
+        :param trade:
+        :param reason: take_profit or stop_loss
+        :return:
+        """
 
-            order_side = "SELL" if trade.side == "long" else "BUY"
+        self._triggers.remove(trade)
+        self._record("exit", trade, {"reason": reason})
 
-            if not self.client.futures:
-                # Make sure we don't sell more than what's in the available balance on Binance Spot
-                current_balances = self.client.get_balances()
-                if current_balances is not None:
-                    if order_side == "SELL" and self.contract.base_asset in current_balances:
-                        trade.quantity = min(
-                            current_balances[self.contract.base_asset].free, trade.quantity)
+        price = self.candles.last_close
 
-            order_status = self.client.place_order(
-                self.contract, "MARKET", trade.quantity, order_side)
+        self.client.execution.submit(f"{self.strat_name} exit order on {self.contract.symbol} {self.tf}",
+                                     lambda: self._send_exit_order(trade, reason, price),
+                                     on_error=lambda: self._exit_failed(trade))
 
-            if order_status is not None:
-                self._add_log(
-                    f"Exit order on {self.contract.symbol} {self.tf} placed successfully")
-                trade.status = "closed"
-                self.ongoing_position = False
+    def _send_exit_order(self, trade: Trade, reason: str, price: float):
+        """
+        Called from the execution thread of the connector.
+        If the order fails, the trade stays open and its triggers are checked again at the next trade.
+        :param trade:
+        :param reason: take_profit or stop_loss
+        :param price: Price that reached the stop loss or take profit
+        :return:
+        """
+
+        sl_triggered = reason == "stop_loss"
+
+        self._add_log(f"{'Stop loss' if sl_triggered else 'Take profit'} for {self.contract.symbol} {self.tf} "
+                      f"| Current Price = {price} (Entry price was {trade.entry_price})")
+
+        order_side = "SELL" if trade.side == "long" else "BUY"
+
+        if not self.client.futures:
+            # Make sure we don't sell more than what's in the available balance on Binance Spot
+            current_balances = self.client.get_balances()
+            if current_balances is not None:
+                if order_side == "SELL" and self.contract.base_asset in current_balances:
+                    trade.quantity = min(
+                        current_balances[self.contract.base_asset].free, trade.quantity)
+
+        order_status = self.client.place_order(
+            self.contract, "MARKET", trade.quantity, order_side)
+
+        if order_status is not None:
+            self._add_log(
+                f"Exit order on {self.contract.symbol} {self.tf} placed successfully")
+            trade.status = "closed"
+            self._record("close", trade, {"quantity": trade.quantity, "pnl": trade.pnl})
+            self.trade_changed(trade)
+            self._archive_trade(trade)
+            self.ongoing_position = False
+        else:
+            self._exit_failed(trade)
+
+    def _exit_failed(self, trade: Trade):
+        """
+        The exit order couldn't be placed: the trade stays open and its triggers are checked again at the next trade.
+        :param trade:
+        :return:
+        """
+
+        self._record("exit_failed", trade)
+        self._arm_tp_sl(trade)
+
+    def _archive_trade(self, trade: Trade):
+        """
+        Remove a closed trade from the live trades, so the PNL updates only loop through the open ones, and queue it
+        to be recorded in the trade journal.
+        :param trade:
+        :return:
+        """
+
+        self.trades = [t for t in self.trades if t is not trade]
+        self.client.trade_journal.archive(trade)
+
+    def _record(self, event: str, trade: Optional[Trade] = None, data: Optional[Dict] = None):
+        """
+        Queue an event of the strategy in the order journal of the client.
+        :param event: entry, placed, fill, exit, exit_failed, close or cancel
+        :param trade: The trade concerned, None before the entry order is placed
+        :param data: Whatever restore() needs to rebuild the trade
+        :return:
+        """
+
+        self.client.order_journal.record(self.journal_key, event, trade.time if trade is not None else None, data)
+
+    def restore(self, events: List[Dict]):
+        """
+        Rebuild the open trades and ongoing_position from the order journal events of the strategy, e.g: when it is
+        started again after the program stopped. Called before the strategy receives market data.
+        The events that are not needed anymore (closed trades, cancelled entries) are deleted from the journal.
+        :param events: Returned by OrderJournal.replay(), oldest first
+        :return:
+        """
+
+        # Strategies already running with the same journal key (same parameters): their trades and their entry
+        # orders being sent are theirs, and their events must stay in the journal
+        running = [s for s in self.client.strategies.values() if s.journal_key == self.journal_key]
+        owned_orders = {t.entry_id for s in self.client.strategies.values() for t in s.trades}
+
+        trades: Dict[int, Trade] = dict()
+        first_seq: Dict[int, int] = dict()  # Sequence number of the first event of each open trade
+        pending_entry = None  # Sequence number of an entry intent not followed by an order or a cancel
+        pending_exits = set()
+
+        for event in events:
+            kind = event['event']
+            data = event['data']
+            trade_time = event['trade_time']
+
+            if kind == "entry":
+                pending_entry = event['seq']
+
+            elif kind == "cancel":
+                pending_entry = None
+
+            elif kind == "placed":
+                trades[trade_time] = Trade({"time": trade_time, "entry_price": data['entry_price'],
+                                            "contract": self.contract, "strategy": self.strat_name,
+                                            "side": data['side'], "status": "open", "pnl": 0,
+                                            "quantity": data['quantity'], "entry_id": data['entry_id']})
+                first_seq[trade_time] = pending_entry if pending_entry is not None else event['seq']
+                pending_entry = None
+
+            elif kind == "fill" and trade_time in trades:
+                trades[trade_time].entry_price = data['entry_price']
+                trades[trade_time].quantity = data['quantity']
+
+            elif kind == "exit":
+                pending_exits.add(trade_time)
+
+            elif kind == "exit_failed":
+                pending_exits.discard(trade_time)
+
+            elif kind == "close":
+                trades.pop(trade_time, None)
+                first_seq.pop(trade_time, None)
+                pending_exits.discard(trade_time)
+
+        if pending_entry is not None and len(running) == 0:
+            self._add_log(f"{self.strat_name} {self.contract.symbol} {self.tf}: the program stopped while an entry "
+                          f"order was being sent, check the open positions on {self.exchange}")
+            self._record("cancel")  # Not reported again at the next start
+
+        for trade in trades.values():
+            if trade.entry_id in owned_orders:
+                continue
+
+            self.trades.append(trade)
+            self.trade_changed(trade)
+
+            if trade.time in pending_exits:
+                self._add_log(f"{self.strat_name} {self.contract.symbol} {self.tf}: the program stopped while the "
+                              f"exit order of a trade was being sent, the trade is considered open")
+
+            if trade.entry_price is not None:
+                self._arm_tp_sl(trade)
+            else:
+                self.client.order_tracker.track(trade.entry_id, self)
+
+        self.ongoing_position = len(self.trades) > 0
+
+        if len(self.trades) > 0:
+            self._add_log(f"{self.strat_name} {self.contract.symbol} {self.tf}: {len(self.trades)} open trade(s) "
+                          f"restored")
+
+        # Only the events of the open trades are needed at the next start
+        if len(events) > 0 and len(running) == 0:
+            self.client.order_journal.compact(self.journal_key, min(first_seq.values(), default=events[-1]['seq'] + 1))
 
 
 class TechnicalStrategy(Strategy):
     def __init__(self, client, contract: Contract, exchange: str, timeframe: str, balance_pct: float, take_profit: float,
                  stop_loss: float, other_params: Dict):
         super().__init__(client, contract, exchange, timeframe,
-                         balance_pct, take_profit, stop_loss, "Technical")
+                         balance_pct, take_profit, stop_loss, "Technical", other_params)
 
         self._ema_fast = other_params['ema_fast']
         self._ema_slow = other_params['ema_slow']
@@ -261,59 +529,51 @@ class TechnicalStrategy(Strategy):
 
         self._rsi_length = other_params['rsi_length']
 
-    def _rsi(self) -> float:
-        """
-        Compute the Relative Strength Index.
-        :return: The RSI value of the previous candlestick
-        """
+        # Indicators are updated once per closed candle instead of being recomputed on the whole history
+        self._macd_state = MacdState(self._ema_fast, self._ema_slow, self._ema_signal)
+        self._rsi_state = RsiState(self._rsi_length)
+        self._last_indicator_ts = None  # Timestamp of the last candle added to the indicators
+
+    def set_candles(self, candles: CandleBuffer):
+        super().set_candles(candles)
 
-        close_list = []
-        for candle in self.candles:
-            close_list.append(candle.close)
+        self._update_indicators()
 
-        closes = pd.Series(close_list)
+    def _update_indicators(self):
+        """
+        Add the candles closed since the last call to the running MACD and RSI.
+        The last candle of the list is still open, so it is not used.
+        :return:
+        """
 
-        # Calculate the different between the value of one row and the value of the row before
-        delta = closes.diff().dropna()
+        timestamps = self.candles.timestamp
+        closes = self.candles.close
 
-        up, down = delta.copy(), delta.copy()
-        up[up < 0] = 0
-        down[down > 0] = 0  # Keep only the negative change, others are set to 0
+        first_new = len(timestamps) - 1
 
-        avg_gain = up.ewm(com=(self._rsi_length - 1),
-                          min_periods=self._rsi_length).mean()
-        avg_loss = down.abs().ewm(com=(self._rsi_length - 1),
-                                  min_periods=self._rsi_length).mean()
+        # Walk back from the end, usually only one candle has been closed since the previous call
+        while first_new > 0 and (self._last_indicator_ts is None
+                                 or timestamps[first_new - 1] > self._last_indicator_ts):
+            first_new -= 1
 
-        rs = avg_gain / avg_loss  # Relative Strength
+        for i in range(first_new, len(timestamps) - 1):
+            self._macd_state.update(float(closes[i]))
+            self._rsi_state.update(float(closes[i]))
+            self._last_indicator_ts = int(timestamps[i])
 
-        rsi = 100 - 100 / (1 + rs)
-        rsi = rsi.round(2)
+    def _rsi(self) -> float:
+        """
+        :return: The RSI value of the previous candlestick
+        """
 
-        return rsi.iloc[-2]
+        return self._rsi_state.value
 
     def _macd(self) -> Tuple[float, float]:
         """
-        Compute the MACD and its Signal line.
         :return: The MACD and the MACD Signal value of the previous candlestick
         """
 
-        close_list = []
-        for candle in self.candles:
-            # Use only the close price of each candlestick for the calculations
-            close_list.append(candle.close)
-
-        # Converts the close prices list to a pandas Series.
-        closes = pd.Series(close_list)
-
-        # Exponential Moving Average method
-        ema_fast = closes.ewm(span=self._ema_fast).mean()
-        ema_slow = closes.ewm(span=self._ema_slow).mean()
-
-        macd_line = ema_fast - ema_slow
-        macd_signal = macd_line.ewm(span=self._ema_signal).mean()
-
-        return macd_line.iloc[-2], macd_signal.iloc[-2]
+        return self._macd_state.macd_line, self._macd_state.macd_signal
 
     def _check_signal(self):
         """
@@ -340,6 +600,9 @@ class TechnicalStrategy(Strategy):
         :return:
         """
 
+        if tick_type == "new_candle":
+            self._update_indicators()
+
         if tick_type == "new_candle" and not self.ongoing_position:
             signal_result = self._check_signal()
 
@@ -351,7 +614,7 @@ class BreakoutStrategy(Strategy):
     def __init__(self, client, contract: Contract, exchange: str, timeframe: str, balance_pct: float, take_profit: float,
                  stop_loss: float, other_params: Dict):
         super().__init__(client, contract, exchange, timeframe,
-                         balance_pct, take_profit, stop_loss, "Breakout")
+                         balance_pct, take_profit, stop_loss, "Breakout", other_params)
 
         self._min_volume = other_params['min_volume']
 
@@ -361,9 +624,15 @@ class BreakoutStrategy(Strategy):
         :return: 1 for a Long signal, -1 for a Short signal, 0 for no signal
         """
 
-        if self.candles[-1].close > self.candles[-2].high and self.candles[-1].volume > self._min_volume:
+        # Views on the candle buffer, no copy
+        close = self.candles.close
+        high = self.candles.high
+        low = self.candles.low
+        volume = self.candles.volume
+
+        if close[-1] > high[-2] and volume[-1] > self._min_volume:
             return 1
-        elif self.candles[-1].close < self.candles[-2].low and self.candles[-1].volume > self._min_volume:
+        elif close[-1] < low[-2] and volume[-1] > self._min_volume:
             return -1
         else:
             return 0
@@ -380,3 +649,32 @@ class BreakoutStrategy(Strategy):
 
             if signal_result in [1, -1]:
                 self._open_position(signal_result)
+
+    def check_trades(self, prices: List[float], sizes: List[float]):
+        """
+        Find the first of the trades after which _check_signal() would have returned a signal: the close and the
+        volume of the current candle are replayed trade by trade, the previous candle doesn't change.
+        :param prices:
+        :param sizes:
+        :return:
+        """
+
+        if self.ongoing_position or len(self.candles) < 2:
+            return
+
+        previous_high = float(self.candles.high[-2])
+        previous_low = float(self.candles.low[-2])
+
+        # Volume of the current candle before these trades
+        volume = float(self.candles.volume[-1]) - sum(sizes)
+
+        for price, size in zip(prices, sizes):
+            volume += size
+
+            if volume > self._min_volume:
+                if price > previous_high:
+                    self._open_position(1)
+                    return
+                elif price < previous_low:
+                    self._open_position(-1)
+                    return
@@ -0,0 +1,82 @@
+"""
+The running indicators, updated one closed candle at a time, against the pandas calculation on the whole history
+that TechnicalStrategy used before.
+"""
+
+import math
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import MacdState, RsiState
+
+
+def random_closes(n: int, seed: int):
+    rng = random.Random(seed)
+    closes = [100.0]
+
+    for _ in range(n - 1):
+        closes.append(closes[-1] * (1 + rng.gauss(0, 0.01)))
+
+    return closes
+
+
+def pandas_macd(closes, ema_fast: int, ema_slow: int, ema_signal: int):
+    closes = pd.Series(closes)
+
+    macd_line = closes.ewm(span=ema_fast).mean() - closes.ewm(span=ema_slow).mean()
+    macd_signal = macd_line.ewm(span=ema_signal).mean()
+
+    return macd_line.tolist(), macd_signal.tolist()
+
+
+def pandas_rsi(closes, rsi_length: int):
+    delta = pd.Series(closes).diff().dropna()
+
+    up, down = delta.copy(), delta.copy()
+    up[up < 0] = 0
+    down[down > 0] = 0
+
+    avg_gain = up.ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+    avg_loss = down.abs().ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+
+    rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+
+    return [math.nan] + rsi.round(2).tolist()  # No RSI for the first close
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("ema_fast, ema_slow, ema_signal", [(12, 26, 9), (5, 35, 5)])
+def test_macd_matches_pandas(seed, ema_fast, ema_slow, ema_signal):
+    closes = random_closes(500, seed)
+    expected_line, expected_signal = pandas_macd(closes, ema_fast, ema_slow, ema_signal)
+
+    state = MacdState(ema_fast, ema_slow, ema_signal)
+    running = [state.update(close) for close in closes]
+
+    np.testing.assert_allclose([r[0] for r in running], expected_line, rtol=0, atol=1e-9)
+    np.testing.assert_allclose([r[1] for r in running], expected_signal, rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("rsi_length", [2, 14])
+def test_rsi_matches_pandas(seed, rsi_length):
+    closes = random_closes(500, seed)
+    expected = pandas_rsi(closes, rsi_length)
+
+    state = RsiState(rsi_length)
+    running = [state.update(close) for close in closes]
+
+    # Both are rounded to 2 decimals, a value right between two roundings may differ by one step
+    np.testing.assert_allclose(running, expected, rtol=0, atol=0.01 + 1e-9)
+
+
+def test_rsi_without_losses_is_100():
+    state = RsiState(3)
+
+    for close in [1.0, 2.0, 3.0, 4.0, 5.0]:
+        state.update(close)
+
+    assert state.value == 100.0
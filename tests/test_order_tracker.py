@@ -0,0 +1,161 @@
+"""
+Order updates of the user data streams replayed through the connectors and the OrderTracker, down to the strategy
+that placed the order.
+"""
+
+import json
+import types
+
+import pytest
+
+from connectors.binance import BinanceClient
+from connectors.bitmex import BitmexClient
+from connectors.decoding import get_decoder
+from connectors.order_tracker import OrderTracker
+
+
+class FakeStrategy:
+    def __init__(self, symbol: str):
+        self.contract = types.SimpleNamespace(symbol=symbol)
+        self.updates = []
+
+    def on_order_update(self, order_status):
+        self.updates.append(order_status)
+
+
+def make_binance(platform: str) -> BinanceClient:
+    # Only the attributes used by _on_user_message(), no connection is opened
+    client = BinanceClient.__new__(BinanceClient)
+    client.platform = platform
+    client.contracts = {"BTCUSDT": types.SimpleNamespace(symbol="BTCUSDT", tick_size=0.01)}
+    client._decode = get_decoder()
+    client.user_stream_connected = True  # The poll thread of the tracker doesn't send requests
+    client.order_tracker = OrderTracker(client)
+
+    return client
+
+
+def make_bitmex() -> BitmexClient:
+    client = BitmexClient.__new__(BitmexClient)
+    client._orders = dict()
+    client.user_stream_connected = True
+    client.order_tracker = OrderTracker(client)
+
+    return client
+
+
+def execution_report(order_id: int, status: str, executed_qty: float, quote_qty: float) -> str:
+    return json.dumps({"e": "executionReport", "s": "BTCUSDT", "i": order_id, "X": status,
+                       "z": str(executed_qty), "Z": str(quote_qty)})
+
+
+def order_trade_update(order_id: int, status: str, executed_qty: float, avg_price: float) -> str:
+    return json.dumps({"e": "ORDER_TRADE_UPDATE",
+                       "o": {"s": "BTCUSDT", "i": order_id, "X": status, "z": str(executed_qty),
+                             "ap": str(avg_price)}})
+
+
+def test_spot_execution_reports():
+    client = make_binance("binance_spot")
+    strategy = FakeStrategy("BTCUSDT")
+
+    client.order_tracker.track(1, strategy)
+
+    client._on_user_message(None, execution_report(1, "NEW", 0, 0))
+    client._on_user_message(None, execution_report(1, "PARTIALLY_FILLED", 0.5, 17500.005))
+    client._on_user_message(None, execution_report(1, "FILLED", 1, 35000.02))
+
+    assert [u.status for u in strategy.updates] == ["new", "partially_filled", "filled"]
+    assert [u.executed_qty for u in strategy.updates] == [0, 0.5, 1]
+
+    # No average price before the first fill, then rounded to the tick size
+    assert strategy.updates[0].avg_price == 0
+    assert strategy.updates[1].avg_price == 35000.01
+    assert strategy.updates[2].avg_price == 35000.02
+
+    # The order is no longer tracked once filled
+    assert client.order_tracker.pending_orders() == dict()
+
+
+def test_futures_order_trade_updates():
+    client = make_binance("binance_futures")
+    strategy = FakeStrategy("BTCUSDT")
+
+    client.order_tracker.track(2, strategy)
+
+    client._on_user_message(None, order_trade_update(2, "NEW", 0, 0))
+    client._on_user_message(None, order_trade_update(2, "FILLED", 0.01, 35000.5))
+
+    assert [(u.order_id, u.status, u.executed_qty, u.avg_price) for u in strategy.updates] == \
+           [(2, "new", 0, 0), (2, "filled", 0.01, 35000.5)]
+    assert client.order_tracker.pending_orders() == dict()
+
+
+def test_other_user_events_are_ignored():
+    client = make_binance("binance_futures")
+    strategy = FakeStrategy("BTCUSDT")
+
+    client.order_tracker.track(3, strategy)
+
+    client._on_user_message(None, json.dumps({"e": "ACCOUNT_UPDATE", "a": {}}))
+    client._on_user_message(None, json.dumps({"result": None, "id": 1}))
+
+    assert strategy.updates == []
+    assert client.order_tracker.pending_orders() == {3: strategy.contract}
+
+
+@pytest.mark.parametrize("status", ["FILLED", "NEW"])
+def test_update_received_before_track(status):
+    # The fill arrives on the stream before place_order() has returned the order id to the strategy
+    client = make_binance("binance_futures")
+    strategy = FakeStrategy("BTCUSDT")
+
+    client._on_user_message(None, order_trade_update(4, status, 0.01 if status == "FILLED" else 0, 35000.5))
+    assert strategy.updates == []
+
+    client.order_tracker.track(4, strategy)
+
+    assert [u.status for u in strategy.updates] == [status.lower()]
+
+    if status == "FILLED":
+        assert client.order_tracker.pending_orders() == dict()
+    else:
+        assert client.order_tracker.pending_orders() == {4: strategy.contract}
+
+
+def test_bitmex_partial_rows():
+    client = make_bitmex()
+    strategy = FakeStrategy("XBTUSD")
+
+    client.order_tracker.track("a1", strategy)
+
+    # The first row of the 'order' table doesn't have the average price yet, nothing to send
+    client._on_order_update([{"orderID": "a1", "symbol": "XBTUSD", "ordStatus": "New", "cumQty": 0}])
+    assert strategy.updates == []
+
+    # The updates only contain the fields that changed, merged with the previous rows of the order
+    client._on_order_update([{"orderID": "a1", "avgPx": None}])
+    client._on_order_update([{"orderID": "a1", "ordStatus": "PartiallyFilled", "cumQty": 50, "avgPx": 35000.5}])
+    client._on_order_update([{"orderID": "a1", "execID": "e1", "ordStatus": "Filled", "cumQty": 100}])
+
+    assert [(u.status, u.executed_qty, u.avg_price) for u in strategy.updates] == \
+           [("new", 0, None), ("partiallyfilled", 50, 35000.5), ("filled", 100, 35000.5)]
+
+    # The rows of a finished order are forgotten
+    assert client._orders == dict()
+    assert client.order_tracker.pending_orders() == dict()
+
+
+def test_bitmex_fill_before_track():
+    client = make_bitmex()
+    strategy = FakeStrategy("XBTUSD")
+
+    client._on_order_update([{"orderID": "b2", "symbol": "XBTUSD", "ordStatus": "New", "cumQty": 0, "avgPx": None},
+                             {"orderID": "b2", "ordStatus": "Filled", "cumQty": 100, "avgPx": 35001.0}])
+    assert strategy.updates == []
+
+    client.order_tracker.track("b2", strategy)
+
+    # Only the latest update is kept for an order nobody claimed yet
+    assert [(u.status, u.executed_qty) for u in strategy.updates] == [("filled", 100)]
+    assert client.order_tracker.pending_orders() == dict()
@@ -0,0 +1,24 @@
+from connectors.price_board import PriceBoard
+
+
+def test_publish_keeps_the_missing_side():
+    board = PriceBoard()
+
+    first = board.publish("XBTUSD", 35000.0, 35000.5, 1)
+    second = board.publish("XBTUSD", ask=35001.0, ts=2)
+
+    assert (second.bid, second.ask, second.ts) == (35000.0, 35001.0, 2)
+    assert second.version > first.version
+
+
+def test_publish_if_absent_never_overwrites_the_stream():
+    board = PriceBoard()
+
+    snapshot = board.publish_if_absent("BTCUSDT", 35000.0, 35000.1, 1)
+    assert board.get("BTCUSDT") is snapshot
+
+    streamed = board.publish("BTCUSDT", 35002.0, 35002.1, 3)
+
+    # An older REST snapshot arriving after the stream update is ignored
+    assert board.publish_if_absent("BTCUSDT", 35001.0, 35001.1, 2) is streamed
+    assert board.get("BTCUSDT") is streamed